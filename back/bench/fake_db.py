@@ -0,0 +1,172 @@
+import hashlib
+import re
+from contextlib import asynccontextmanager
+
+from pymysql.constants import ER
+from pymysql.err import IntegrityError
+
+# FakeUserTable クラスは、users テーブルと revoked_tokens テーブルをメモリ上で再現するMySQLの代替です。
+# UserRepo と RevokedTokenRepo が発行するSQLだけを解釈します。
+class FakeUserTable:
+
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+        # jti -> {"id", "jti", "expires_at"}
+        self.revoked: dict[str, dict] = {}
+        self.revoked_last_id = 0
+
+    # 行のバージョン（MD5(CONCAT(email, ':', pw))）
+    @staticmethod
+    def version(row: dict) -> str:
+        return hashlib.md5(f"{row['email']}:{row['pw']}".encode()).hexdigest()
+
+    # SQLを解釈して結果行と影響行数を返す
+    def run(self, sql: str, args) -> tuple[list[dict], int]:
+        sql = " ".join(sql.split())
+        head = sql[:6].upper()
+
+        if "revoked_tokens" in sql:
+            return self.run_revoked(sql, head, args)
+
+        if head == "SELECT" and "BIT_XOR" in sql:
+            page = [r for e, r in sorted(self.rows.items()) if e > args["after"]][:args["limit"]]
+            digest = 0
+            for r in page:
+                digest ^= int(self.version(r)[:16], 16)
+            return [{
+                "count": len(page),
+                "last_email": page[-1]["email"] if page else None,
+                "digest": digest,
+            }], 1
+
+        if head == "SELECT" and "MD5" in sql:
+            row = self.rows.get(args["email"])
+            return ([{"version": self.version(row)}], 1) if row else ([], 0)
+
+        if head == "SELECT":
+            if "email IN" in sql:
+                rows = [self.rows[e] for e in args if e in self.rows]
+            elif "email = %(email)s" in sql:
+                row = self.rows.get(args["email"])
+                rows = [row] if row else []
+            elif "email > %(after)s" in sql:
+                rows = [r for e, r in sorted(self.rows.items()) if e > args["after"]][:args["limit"]]
+            else:
+                rows = [r for _, r in sorted(self.rows.items())]
+            columns = re.search(r"SELECT (.+?) FROM", sql).group(1).replace(" ", "").split(",")
+            return [{c: r.get(c) for c in columns} for r in rows], len(rows)
+
+        if head == "INSERT":
+            if args["email"] in self.rows:
+                raise IntegrityError(ER.DUP_ENTRY, f"Duplicate entry '{args['email']}' for key 'PRIMARY'")
+            self.rows[args["email"]] = dict(args)
+            return [], 1
+
+        if head == "UPDATE":
+            row = self.rows.get(args["email"])
+            if row is None:
+                return [], 0
+            if "old_pw" in args:
+                if row["pw"] != args["old_pw"]:
+                    return [], 0
+                row["pw"] = args["pw"]
+                return [], 1
+            row.update(args)
+            return [], 1
+
+        if head == "DELETE":
+            return [], 1 if self.rows.pop(args["email"], None) else 0
+
+        raise NotImplementedError(sql)
+
+    # revoked_tokens テーブルへのSQLを解釈する
+    def run_revoked(self, sql: str, head: str, args) -> tuple[list[dict], int]:
+        if head == "INSERT":
+            if args["jti"] in self.revoked:
+                return [], 0
+            self.revoked_last_id += 1
+            self.revoked[args["jti"]] = {
+                "id": self.revoked_last_id,
+                "jti": args["jti"],
+                "expires_at": args["expires_at"],
+            }
+            return [], 1
+
+        if head == "SELECT" and "jti = %(jti)s" in sql:
+            return ([{"found": 1}], 1) if args["jti"] in self.revoked else ([], 0)
+
+        if head == "SELECT":
+            rows = sorted(
+                (r for r in self.revoked.values() if r["id"] > args["last_id"] and r["expires_at"] > args["now"]),
+                key=lambda r: r["id"]
+            )
+            return [dict(r) for r in rows], len(rows)
+
+        if head == "DELETE":
+            expired = [jti for jti, r in self.revoked.items() if r["expires_at"] <= args["now"]]
+            for jti in expired:
+                del self.revoked[jti]
+            return [], len(expired)
+
+        raise NotImplementedError(sql)
+
+# FakeConnection クラスは、LazyConnection と同じトランザクションAPIを持つ接続です。
+class FakeConnection:
+
+    in_transaction = False
+
+    async def begin(self) -> None:
+        self.in_transaction = True
+
+    async def commit(self) -> None:
+        self.in_transaction = False
+
+    async def rollback(self) -> None:
+        self.in_transaction = False
+
+# FakeCursor クラスは、UserRepo が使う DictCursor のAPIを再現したカーソルです。
+class FakeCursor:
+
+    def __init__(
+        self,
+        table: FakeUserTable
+    ):
+        self.table = table
+        self._rows: list[dict] = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    async def execute(self, sql: str, args=None, primary: bool = False) -> int:
+        self._rows, self.rowcount = self.table.run(sql, args)
+        return self.rowcount
+
+    async def executemany(self, sql: str, args) -> int:
+        total = 0
+        for row in args:
+            total += await self.execute(sql, row)
+        self.rowcount = total
+        return total
+
+    async def fetchone(self) -> dict | None:
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchmany(self, size: int = 1) -> list[dict]:
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    async def fetchall(self) -> list[dict]:
+        rows, self._rows = self._rows, []
+        return rows
+
+# get_conn_and_cursor の代わりに使う依存関数を作成する
+def make_conn_and_cursor(table: FakeUserTable):
+    async def get_fake_conn_and_cursor():
+        yield FakeConnection(), FakeCursor(table)
+    return get_fake_conn_and_cursor
+
+# get_stream_cursor の代わりに使うコンテキストマネージャーを作成する
+def make_stream_cursor(table: FakeUserTable):
+    @asynccontextmanager
+    async def get_fake_stream_cursor():
+        yield FakeCursor(table)
+    return get_fake_stream_cursor
@@ -0,0 +1,207 @@
+"""
+FastAPI アプリ全体を ASGI クライアントで直接呼び出す負荷試験ハーネス
+
+既定では get_conn_and_cursor をメモリ上のMySQL代替（bench/fake_db.py）に差し替えて実行し、
+--mysql を指定した場合は .env.development などの設定に従ってローカルのMySQLへ接続します。
+
+使い方（back ディレクトリで実行）:
+    python -m bench.loadtest                                  # 全シナリオを実行
+    python -m bench.loadtest --scenario me_polling -n 5000    # シナリオを指定
+    python -m bench.loadtest --save-baseline bench/baseline.json
+    python -m bench.loadtest --baseline bench/baseline.json --tolerance 0.2
+
+--baseline を指定した場合、requests/sec が許容率以上に低下するか p95 が許容率以上に悪化すると
+終了コード 1 で終了します。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCH_PW = "bench-password"
+BENCH_USERS = 1000
+
+# --mysql を指定しない場合に必要な設定値を補う
+def set_default_env() -> None:
+    for key, value in {
+        "MYSQL_HOST": "localhost",
+        "MYSQL_USER": "bench",
+        "MYSQL_PASSWORD": "bench",
+        "MYSQL_DB": "bench",
+        "TOKEN_ACCESS_EXPIRE_MINUTES": "30",
+        "TOKEN_REFRESH_EXPIRE_DAYS": "7",
+        "TOKEN_SECRET_KEY": "bench-secret-key",
+        "TOKEN_ALGORITHM": "HS256",
+    }.items():
+        os.environ.setdefault(key, value)
+
+# 負荷試験ではログイン試行の制限とアドミッション制御の上限を外す
+def disable_throttling_env() -> None:
+    for key, value in {
+        "LOGIN_IP_BURST": "1000000000",
+        "LOGIN_EMAIL_BURST": "1000000000",
+        "ADMISSION_HASH_QUEUE_SIZE": "1000000",
+        "ADMISSION_READ_QUEUE_SIZE": "1000000",
+        "ADMISSION_WRITE_QUEUE_SIZE": "1000000",
+    }.items():
+        os.environ.setdefault(key, value)
+
+# 1シナリオを実行してレイテンシの一覧と経過時間を返す
+async def run_scenario(client, request, total: int, concurrency: int) -> tuple[list[float], float, int]:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await request(client)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - start, errors
+
+# 百分位数を計算する
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+# 各シナリオのリクエスト
+async def login_storm(client):
+    return await client.post("/login", json={"email": "user0000@example.com", "pw": BENCH_PW})
+
+async def me_polling(client):
+    return await client.get("/me")
+
+async def refresh_churn(client):
+    return await client.post("/refresh")
+
+async def user_listing(client):
+    return await client.get("/users/", params={"limit": 100})
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "me_polling": me_polling,
+    "refresh_churn": refresh_churn,
+    "user_listing": user_listing,
+}
+
+# テスト用ユーザーを作成する
+async def seed_users(app, use_mysql: bool) -> None:
+    from src.schemas.user import UserInDB
+    from src.security import get_hashed_pw
+
+    hashed_pw = get_hashed_pw(BENCH_PW)
+    users = [UserInDB(email=f"user{i:04d}@example.com", pw=hashed_pw) for i in range(BENCH_USERS)]
+
+    if use_mysql:
+        from src.db import get_conn_and_cursor
+        from src.repositories.user import UserRepo
+        async for conn, cursor in get_conn_and_cursor():
+            repo = UserRepo(cursor)
+            emails = await repo.get_existing_emails([u.email for u in users])
+            new_users = [u for u in users if u.email not in emails]
+            if new_users:
+                await repo.create_many(new_users)
+    else:
+        for user in users:
+            app.state.bench_table.rows[user.email] = user.model_dump()
+
+async def main(args) -> int:
+    import httpx
+    from src.main import app
+
+    if not args.mysql:
+        from bench.fake_db import FakeUserTable, make_conn_and_cursor, make_stream_cursor
+        from src.db import get_conn_and_cursor
+        from src.routers import user as user_router
+
+        table = FakeUserTable()
+        app.state.bench_table = table
+        app.dependency_overrides[get_conn_and_cursor] = make_conn_and_cursor(table)
+        user_router.get_stream_cursor = make_stream_cursor(table)
+
+    results: dict[str, dict] = {}
+    async with app.router.lifespan_context(app) if args.mysql else contextlib.nullcontext():
+        await seed_users(app, args.mysql)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # ログイン済みのクッキーを取得しておく
+            response = await login_storm(client)
+            response.raise_for_status()
+
+            for name in args.scenario or SCENARIOS:
+                total = args.requests if name != "login_storm" else max(1, args.requests // 20)
+                latencies, elapsed, errors = await run_scenario(
+                    client, SCENARIOS[name], total, args.concurrency
+                )
+                results[name] = {
+                    "requests": total,
+                    "errors": errors,
+                    "rps": total / elapsed,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p95_ms": percentile(latencies, 95) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "mean_ms": statistics.fmean(latencies) * 1000,
+                }
+                r = results[name]
+                print(
+                    f"{name:15s} {r['rps']:10.1f} req/s  p50 {r['p50_ms']:8.2f}ms  "
+                    f"p95 {r['p95_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  errors {errors}"
+                )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"ベースラインを保存しました: {args.save_baseline}")
+
+    if args.baseline:
+        return compare(results, args.baseline, args.tolerance)
+    return 0
+
+# ベースラインと比較し、許容範囲を超えて悪化したシナリオがあれば 1 を返す
+def compare(results: dict, path: str, tolerance: float) -> int:
+    with open(path) as f:
+        baseline = json.load(f)
+
+    failed = False
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r["rps"] < base["rps"] * (1 - tolerance):
+            print(f"REGRESSION {name}: rps {r['rps']:.1f} < baseline {base['rps']:.1f}")
+            failed = True
+        if r["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            print(f"REGRESSION {name}: p95 {r['p95_ms']:.2f}ms > baseline {base['p95_ms']:.2f}ms")
+            failed = True
+    return 1 if failed else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="エンドツーエンド負荷試験")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS.keys())
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--mysql", action="store_true", help="ローカルのMySQLに接続して実行する")
+    parser.add_argument("--baseline", help="比較するベースラインのJSON")
+    parser.add_argument("--save-baseline", help="結果をベースラインとして保存するJSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.mysql:
+        set_default_env()
+    disable_throttling_env()
+    sys.exit(asyncio.run(main(args)))
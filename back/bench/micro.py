@@ -0,0 +1,176 @@
+"""
+security.py の各処理のマイクロベンチマーク
+
+bcrypt のコストと JWT のアルゴリズムごとに以下の処理時間を計測し、JSON に記録します。
+    - verify_pw / get_hashed_pw
+    - create_access_token / create_refresh_token
+    - get_cur_user 内の jwt.decode（decode_token のキャッシュ未使用時と使用時）
+RS256 / ES256 は実行のたびに使い捨ての秘密鍵を作成し、TOKEN_SIGNING_KEYS に設定して計測します（cryptography が必要）。
+
+使い方（back ディレクトリで実行）:
+    python -m bench.micro --output bench/micro-results.json
+    python -m bench.micro --save-baseline bench/micro-baseline.json
+    python -m bench.micro --baseline bench/micro-baseline.json --tolerance 0.25
+
+--baseline を指定した場合、中央値が許容率以上に悪化した項目があれば終了コード 1 で終了します。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BCRYPT_ROUNDS = (10, 12)
+JWT_ALGORITHMS = ("HS256", "HS384", "HS512", "RS256", "ES256")
+
+# 必要な設定値を補う
+def set_default_env() -> None:
+    for key, value in {
+        "MYSQL_HOST": "localhost",
+        "MYSQL_USER": "bench",
+        "MYSQL_PASSWORD": "bench",
+        "MYSQL_DB": "bench",
+        "TOKEN_ACCESS_EXPIRE_MINUTES": "30",
+        "TOKEN_REFRESH_EXPIRE_DAYS": "7",
+        "TOKEN_SECRET_KEY": "bench-secret-key",
+        "TOKEN_ALGORITHM": "HS256",
+    }.items():
+        os.environ.setdefault(key, value)
+
+# 関数を繰り返し実行して1回あたりの時間（マイクロ秒）の統計を返す
+def measure(func, repeat: int, number: int) -> dict:
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number * 1_000_000)
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+    }
+
+# 非対称鍵のアルゴリズム用に使い捨ての秘密鍵PEMを作成する
+def write_private_key(algorithm: str, directory: str) -> str:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm.startswith("RS"):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    path = os.path.join(directory, f"{algorithm}.pem")
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    return path
+
+# JWT のアルゴリズムを切り替える（HS* は TOKEN_SECRET_KEY、それ以外は key_dir に作成した鍵で署名する）
+def use_algorithm(algorithm: str, key_dir: str) -> None:
+    from src.config import get_settings
+    from src.dependencies.auth import get_token_cache
+    from src.keyring import get_keyring
+
+    if algorithm.startswith("HS"):
+        os.environ["TOKEN_ALGORITHM"] = algorithm
+        os.environ["TOKEN_SIGNING_KEYS"] = ""
+    else:
+        os.environ["TOKEN_SIGNING_KEYS"] = f"bench:{algorithm}:{write_private_key(algorithm, key_dir)}"
+    get_settings.cache_clear()
+    get_token_cache.cache_clear()
+    get_keyring.cache_clear()
+
+def run(repeat: int) -> dict:
+    from passlib.context import CryptContext
+    from src import security
+    from src.dependencies.auth import decode_token, get_token_cache
+    from src.schemas.token import TokenPayload
+
+    results: dict[str, dict] = {}
+
+    # bcrypt はコストごとに計測（security.pw_ctx を差し替える）
+    original_ctx = security.pw_ctx
+    try:
+        for rounds in BCRYPT_ROUNDS:
+            security.pw_ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+            hashed = security.get_hashed_pw("bench-password")
+            results[f"get_hashed_pw[bcrypt-{rounds}]"] = measure(
+                lambda: security.get_hashed_pw("bench-password"), repeat, 1
+            )
+            results[f"verify_pw[bcrypt-{rounds}]"] = measure(
+                lambda: security.verify_pw("bench-password", hashed), repeat, 1
+            )
+    finally:
+        security.pw_ctx = original_ctx
+
+    # JWT はアルゴリズムごとに計測
+    payload = TokenPayload(sub="bench@example.com")
+    with tempfile.TemporaryDirectory() as key_dir:
+        for algorithm in JWT_ALGORITHMS:
+            use_algorithm(algorithm, key_dir)
+            token, _ = security.create_access_token(payload=payload)
+
+            results[f"create_access_token[{algorithm}]"] = measure(
+                lambda: security.create_access_token(payload=payload), repeat, 200
+            )
+            results[f"create_refresh_token[{algorithm}]"] = measure(
+                lambda: security.create_refresh_token(payload=payload), repeat, 200
+            )
+
+            def decode_cold():
+                get_token_cache().clear()
+                decode_token(token)
+            results[f"decode_token[{algorithm},cold]"] = measure(decode_cold, repeat, 200)
+            results[f"decode_token[{algorithm},cached]"] = measure(
+                lambda: decode_token(token), repeat, 2000
+            )
+
+    return results
+
+# ベースラインと比較し、許容範囲を超えて悪化した項目があれば 1 を返す
+def compare(results: dict, path: str, tolerance: float) -> int:
+    with open(path) as f:
+        baseline = json.load(f)
+
+    failed = False
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r["median_us"] > base["median_us"] * (1 + tolerance):
+            print(f"REGRESSION {name}: {r['median_us']:.1f}us > baseline {base['median_us']:.1f}us")
+            failed = True
+    return 1 if failed else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="security.py のマイクロベンチマーク")
+    parser.add_argument("-r", "--repeat", type=int, default=7)
+    parser.add_argument("--output", help="結果を書き出すJSON")
+    parser.add_argument("--baseline", help="比較するベースラインのJSON")
+    parser.add_argument("--save-baseline", help="結果をベースラインとして保存するJSON")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+def main(args) -> int:
+    results = run(args.repeat)
+    for name, r in results.items():
+        print(f"{name:40s} median {r['median_us']:12.2f}us  min {r['min_us']:12.2f}us")
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"結果を保存しました: {path}")
+
+    if args.baseline:
+        return compare(results, args.baseline, args.tolerance)
+    return 0
+
+if __name__ == "__main__":
+    set_default_env()
+    sys.exit(main(parse_args()))
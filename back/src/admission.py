@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+from src.config import get_settings
+from src.metrics import admission_rejected_total
+
+# AdmissionLimiter クラスは、同時実行数と待ち行列の長さを制限するリミッターです。
+# 待ち行列が満杯の場合や待ち時間が上限を超えた場合は受け付けを拒否します。
+class AdmissionLimiter:
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        queue_size: int,
+        queue_timeout: float
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._sem = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    # 実行枠を取得（取得できない場合は False）
+    async def acquire(self) -> bool:
+        if self._sem.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._sem.acquire()
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+# パスワードハッシュを伴うルート
+HASH_ROUTES = {
+    ("POST", "/login"),
+    ("POST", "/users/"),
+    ("POST", "/users/bulk"),
+}
+
+# POST だが参照として扱うルート
+READ_ROUTES = {
+    ("POST", "/introspect"),
+}
+
+# 制限の対象外とするパス
+EXEMPT_PATHS = ("/healthz", "/readyz", "/metrics", "/stats", "/.well-known/jwks.json")
+
+# ルートの分類（hash: パスワードハッシュを伴う処理、read: 参照、write: 更新）
+def classify(method: str, path: str) -> str | None:
+    if path in EXEMPT_PATHS or method == "OPTIONS":
+        return None
+    if (method, path) in HASH_ROUTES:
+        return "hash"
+    if method in ("GET", "HEAD") or (method, path) in READ_ROUTES:
+        return "read"
+    return "write"
+
+limiters: dict[str, AdmissionLimiter] = {}
+
+# 分類ごとのリミッターの状態を取得する関数
+def get_admission_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+# AdmissionMiddleware クラスは、ルートの分類ごとに同時実行数を制限し、
+# 上限に達した場合は待たせ続けずに 503 と Retry-After を返すASGIミドルウェアです。
+class AdmissionMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self.enabled = settings.ADMISSION_ENABLED
+        self.retry_after = str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode()
+        for name, concurrency, queue_size in (
+            ("hash", settings.ADMISSION_HASH_CONCURRENCY, settings.ADMISSION_HASH_QUEUE_SIZE),
+            ("read", settings.ADMISSION_READ_CONCURRENCY, settings.ADMISSION_READ_QUEUE_SIZE),
+            ("write", settings.ADMISSION_WRITE_CONCURRENCY, settings.ADMISSION_WRITE_QUEUE_SIZE),
+        ):
+            limiters[name] = AdmissionLimiter(
+                name, concurrency, queue_size, settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+            )
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope["method"], scope["path"]) if scope["type"] == "http" and self.enabled else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[route_class]
+        if not await limiter.acquire():
+            # 拒否したリクエストはルーティングされず route="unmatched" として記録されるため、分類ごとに別途数える
+            admission_rejected_total.inc(route_class)
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", self.retry_after),
+                ],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": json.dumps({"detail": "サーバーが混雑しています。しばらくしてから再度お試しください"}, ensure_ascii=False).encode(),
+            })
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
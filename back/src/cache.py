@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# TTLCache クラスは、有効期限とLRU方式の追い出しを備えたプロセス内キャッシュです。
+class TTLCache:
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # 値を取得（期限切れ・未登録の場合はNone）
+    def get(
+        self,
+        key: Hashable
+    ) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # 値を登録（ttlを省略した場合は既定の有効期間）
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: float | None = None
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # 値を削除
+    def invalidate(
+        self,
+        key: Hashable
+    ) -> None:
+        self._data.pop(key, None)
+
+    # 全件削除
+    def clear(self) -> None:
+        self._data.clear()
+
+    # 統計情報を取得
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
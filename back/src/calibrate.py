@@ -0,0 +1,23 @@
+"""
+bcrypt のコストをこのホストで計測して推奨値を表示するCLI
+
+使い方（back ディレクトリで実行）:
+    python -m src.calibrate --target-ms 250
+表示された値を PW_HASH_ROUNDS に設定してください。
+"""
+import argparse
+
+from src.security import calibrate_pw_rounds
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="bcrypt のコストを計測する")
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    args = parser.parse_args()
+
+    rounds = calibrate_pw_rounds(args.target_ms, args.min_rounds, args.max_rounds)
+    print(f"PW_HASH_ROUNDS={rounds}")
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,95 @@ class Settings(BaseSettings):
     MYSQL_USER: str
     MYSQL_PASSWORD: str
     MYSQL_DB: str
+    # 読み取り専用レプリカ（"host:port" をカンマ区切りで指定）
+    MYSQL_REPLICA_HOSTS: str = ""
+    DB_REPLICA_HEALTH_INTERVAL_SECONDS: float = 5.0
+    # コネクションプール
+    DB_POOL_MINSIZE: int = 1
+    DB_POOL_MAXSIZE: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 3600
+    DB_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    DB_ACQUIRE_TIMEOUT_SECONDS: float = 5.0
+    # この秒数以上使われていない接続は取得時にpingで検証する
+    DB_PRE_PING_IDLE_SECONDS: float = 30.0
     TOKEN_ACCESS_EXPIRE_MINUTES: int
     TOKEN_REFRESH_EXPIRE_DAYS: int
     TOKEN_SECRET_KEY: str
     TOKEN_ALGORITHM: str
+    # 非対称鍵による署名（"kid:ALG:秘密鍵PEMのパス" をカンマ区切りで指定）
+    TOKEN_SIGNING_KEYS: str = ""
+    # 検証のみに使う公開鍵（"kid:ALG:公開鍵PEMのパス" をカンマ区切りで指定、鍵のローテーション用）
+    TOKEN_VERIFY_KEYS: str = ""
+    # 署名に使う kid（None の場合は TOKEN_SIGNING_KEYS の先頭）
+    TOKEN_ACTIVE_KID: str | None = None
+    # パスワードハッシュ用プロセスプール（None の場合はCPUコア数）
+    PW_HASH_WORKERS: int | None = None
+    # ハッシュ処理の待ち行列の上限（超えた場合は503を返す）
+    PW_HASH_QUEUE_SIZE: int = 64
+    # 一括ハッシュ化が同時に使うワーカー数（None の場合はワーカー数の半分）と1回に送るパスワード数
+    PW_HASH_BULK_WORKERS: int | None = None
+    PW_HASH_BULK_BATCH_SIZE: int = 4
+    # bcrypt のコスト（None の場合は passlib の既定値、PW_HASH_CALIBRATE=True の場合は起動時に計測して決定）
+    PW_HASH_ROUNDS: int | None = None
+    PW_HASH_CALIBRATE: bool = False
+    PW_HASH_TARGET_MS: float = 250.0
+    PW_HASH_MIN_ROUNDS: int = 10
+    PW_HASH_MAX_ROUNDS: int = 16
+    # 認証済みユーザー（プリンシパル）キャッシュ
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    # 検証済みトークンキャッシュ
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_CACHE_SIZE: int = 10000
+    # ログイン試行の制限
+    LOGIN_IP_RATE_PER_MINUTE: float = 30.0
+    LOGIN_IP_BURST: int = 30
+    LOGIN_EMAIL_RATE_PER_MINUTE: float = 10.0
+    LOGIN_EMAIL_BURST: int = 10
+    LOGIN_THROTTLE_MAX_KEYS: int = 200000
+    # X-Forwarded-For を信頼するプロキシのアドレス（カンマ区切り、未設定の場合は接続元のアドレスで制限する）
+    TRUSTED_PROXIES: str = ""
+    # アドミッション制御（ルートの分類ごとの同時実行数・待ち行列・待ち時間）
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_HASH_CONCURRENCY: int = 16
+    ADMISSION_HASH_QUEUE_SIZE: int = 64
+    ADMISSION_READ_CONCURRENCY: int = 200
+    ADMISSION_READ_QUEUE_SIZE: int = 1000
+    ADMISSION_WRITE_CONCURRENCY: int = 50
+    ADMISSION_WRITE_QUEUE_SIZE: int = 200
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    # 運用向けエンドポイント（/stats）の X-Admin-Token（None の場合は無効）
+    ADMIN_TOKEN: str | None = None
+    # /introspect を呼び出すAPIサーバーが X-Introspect-Token に指定する共有トークン（None の場合は無効）
+    INTROSPECT_CLIENT_TOKEN: str | None = None
+    # 1リクエストで実行してよいSQLの数（超えた場合は警告を出す）
+    SQL_QUERY_BUDGET: int = 5
+    # 停止シグナルを受けてから /readyz を 503 にしたまま処理を続ける秒数
+    DRAIN_GRACE_SECONDS: float = 5.0
+    # 停止時に処理中のリクエストを待つ最大秒数（uvicorn の timeout_graceful_shutdown）
+    DRAIN_TIMEOUT_SECONDS: float = 20.0
+    # ログ
+    LOG_LEVEL: str = "INFO"
+    LOG_RATE_LIMIT_PER_SECOND: float = 10.0
+    # プロファイラー
+    PROFILER_ENABLED: bool = False
+    PROFILER_SAMPLE_RATE: float = 0.0
+    PROFILER_SLOW_THRESHOLD_MS: float | None = None
+    PROFILER_ADMIN_TOKEN: str | None = None
+    PROFILER_DIR: str = "profiles"
+    PROFILER_MAX_FILES: int = 100
+    # トークン失効（ブルームフィルターのビット数・ハッシュ数・有効期限バケットの幅・同期間隔）
+    REVOCATION_BLOOM_BITS: int = 1 << 20
+    REVOCATION_BLOOM_HASHES: int = 7
+    REVOCATION_BUCKET_SECONDS: int = 3600
+    REVOCATION_SYNC_SECONDS: float = 5.0
+    # 同期のたびに読み直す id の幅（後からコミットされた小さい id の行を取りこぼさないため）
+    REVOCATION_SYNC_OVERLAP_IDS: int = 1000
+    # ユーザー一括作成のチャンクサイズ
+    BULK_CHUNK_SIZE: int = 500
+    # JSON配列で受け付けるボディの上限（大量の取り込みは NDJSON でストリーミングする）
+    BULK_JSON_MAX_BYTES: int = 1 << 20
 
     env_file: ClassVar[str] = ".env.production" if os.getenv('ENV') == 'production' else ".env.development"
     
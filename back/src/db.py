@@ -1,28 +1,116 @@
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import time
 import aiomysql
-from aiomysql import Pool
-from fastapi import HTTPException
+from aiomysql import Connection, Pool
+from pymysql.constants import CLIENT
+from fastapi import HTTPException, status
 from src.config import get_settings
+from src.metrics import db_acquire_wait_seconds, db_query_duration_seconds, query_method
+from src.timing import record_sql
+
+logger = logging.getLogger(__name__)
 
 pool: Pool = None
 
+# 読み取り専用レプリカのプールと稼働状態
+replica_pools: list[Pool] = []
+replica_healthy: list[bool] = []
+replica_hosts: list[str] = []
+replica_health_task: asyncio.Task | None = None
+replica_index = 0
+
+# 接続取得の統計情報
+pool_stats = {
+    "waiters": 0,
+    "acquires": 0,
+    "timeouts": 0,
+    "pings": 0,
+    "wait_total_seconds": 0.0,
+    "wait_max_seconds": 0.0,
+}
+
+# 接続プールを作成する関数
+async def create_db_pool(
+    host: str,
+    port: int
+) -> Pool:
+    settings = get_settings()
+    return await aiomysql.create_pool(
+        host=host,
+        port=port,
+        user=settings.MYSQL_USER,
+        password=settings.MYSQL_PASSWORD,
+        db=settings.MYSQL_DB,
+        minsize=settings.DB_POOL_MINSIZE,
+        maxsize=settings.DB_POOL_MAXSIZE,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        connect_timeout=settings.DB_CONNECT_TIMEOUT_SECONDS,
+        autocommit=True,
+        # UPDATE の rowcount を「変更行数」ではなく「一致行数」にする
+        client_flag=CLIENT.FOUND_ROWS,
+    )
+
 # データベース接続プールを初期化する関数
 async def init_db_pool():
     global pool
     try:
         settings = get_settings()
-        pool = await aiomysql.create_pool(
-            host=settings.MYSQL_HOST,
-            port=settings.MYSQL_PORT,
-            user=settings.MYSQL_USER,
-            password=settings.MYSQL_PASSWORD,
-            db=settings.MYSQL_DB,
-            minsize=1,
-            maxsize=10,
-            autocommit=True,
-        )
+        pool = await create_db_pool(settings.MYSQL_HOST, settings.MYSQL_PORT)
+        await warm_db_pool()
     except Exception as e:
-        print("データベース接続エラー")
+        logger.error("データベース接続エラー", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=f"Database connectionection error: {e}")
+    await init_replica_pools()
+
+# レプリカの接続プールを初期化する関数（接続できないレプリカは停止中として扱う）
+async def init_replica_pools() -> None:
+    global replica_health_task
+    settings = get_settings()
+    for entry in filter(None, (h.strip() for h in settings.MYSQL_REPLICA_HOSTS.split(","))):
+        host, _, port = entry.partition(":")
+        replica_hosts.append(entry)
+        try:
+            replica_pools.append(await create_db_pool(host, int(port or settings.MYSQL_PORT)))
+            replica_healthy.append(True)
+        except Exception as e:
+            logger.warning("レプリカ接続エラー", extra={"replica": entry, "error": str(e)})
+            replica_pools.append(None)
+            replica_healthy.append(False)
+
+    if replica_hosts:
+        replica_health_task = asyncio.create_task(check_replicas())
+
+# レプリカの稼働状態を定期的に確認する
+async def check_replicas() -> None:
+    settings = get_settings()
+    while True:
+        await asyncio.sleep(settings.DB_REPLICA_HEALTH_INTERVAL_SECONDS)
+        for i, entry in enumerate(replica_hosts):
+            try:
+                if replica_pools[i] is None:
+                    host, _, port = entry.partition(":")
+                    replica_pools[i] = await create_db_pool(host, int(port or settings.MYSQL_PORT))
+                async with replica_pools[i].acquire() as conn:
+                    await asyncio.wait_for(conn.ping(reconnect=True), settings.DB_CONNECT_TIMEOUT_SECONDS)
+                replica_healthy[i] = True
+            except Exception:
+                replica_healthy[i] = False
+
+# レプリカの接続プールを閉じる関数
+async def close_replica_pools() -> None:
+    global replica_health_task
+    if replica_health_task is not None:
+        replica_health_task.cancel()
+        replica_health_task = None
+    for replica_pool in replica_pools:
+        if replica_pool is not None:
+            replica_pool.close()
+            await replica_pool.wait_closed()
+    replica_pools.clear()
+    replica_healthy.clear()
+    replica_hosts.clear()
 
 # 接続プールを取得する関数
 def get_pool() -> Pool:
@@ -31,8 +119,228 @@ def get_pool() -> Pool:
         raise HTTPException(status_code=500, detail="Database connectionection pool is not initialized")
     return pool
 
-# 接続とカーソルを取得する非同期ジェネレータ    
+# minsize 分の接続を開いて検証しておく関数
+async def warm_db_pool() -> None:
+    settings = get_settings()
+    conns = await asyncio.gather(*[
+        pool.acquire() for _ in range(settings.DB_POOL_MINSIZE)
+    ])
+    try:
+        await asyncio.gather(*[conn.ping(reconnect=True) for conn in conns])
+    finally:
+        for conn in conns:
+            pool.release(conn)
+
+# 稼働中のレプリカをラウンドロビンで選ぶ（なければNone）
+def pick_replica() -> Pool | None:
+    global replica_index
+    for _ in range(len(replica_pools)):
+        replica_index = (replica_index + 1) % len(replica_pools)
+        if replica_healthy[replica_index]:
+            return replica_pools[replica_index]
+    return None
+
+# 接続を取得する関数
+# readonly=True の場合は稼働中のレプリカを使い、失敗した場合はプライマリへフォールバックする。
+# 返却先のプールと接続の組を返す。
+async def acquire_conn(readonly: bool = False) -> tuple[Pool, Connection]:
+    replica = pick_replica() if readonly else None
+    if replica is not None:
+        try:
+            return replica, await acquire_conn_from(replica)
+        except Exception:
+            replica_healthy[replica_pools.index(replica)] = False
+    db_pool = get_pool()
+    return db_pool, await acquire_conn_from(db_pool)
+
+# プールから接続を取得する関数（タイムアウトと事前pingによる検証付き）
+async def acquire_conn_from(db_pool: Pool) -> Connection:
+    settings = get_settings()
+    start = time.perf_counter()
+    pool_stats["waiters"] += 1
+    try:
+        conn = await asyncio.wait_for(
+            db_pool.acquire(),
+            timeout=settings.DB_ACQUIRE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        pool_stats["timeouts"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="データベース接続の取得がタイムアウトしました",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        pool_stats["waiters"] -= 1
+        pool_stats["acquires"] += 1
+        pool_stats["wait_total_seconds"] += elapsed
+        pool_stats["wait_max_seconds"] = max(pool_stats["wait_max_seconds"], elapsed)
+        db_acquire_wait_seconds.observe(elapsed)
+
+    # しばらく使われていない接続は切断されている可能性があるため検証する
+    try:
+        idle = asyncio.get_running_loop().time() - conn.last_usage
+        if idle > settings.DB_PRE_PING_IDLE_SECONDS:
+            pool_stats["pings"] += 1
+            await conn.ping(reconnect=True)
+    except Exception:
+        db_pool.release(conn)
+        raise
+    return conn
+
+# 接続プールの状態を取得する関数
+def get_pool_stats() -> dict:
+    acquires = pool_stats["acquires"]
+    return {
+        "size": pool.size if pool else 0,
+        "free": pool.freesize if pool else 0,
+        "minsize": pool.minsize if pool else 0,
+        "maxsize": pool.maxsize if pool else 0,
+        "waiters": pool_stats["waiters"],
+        "acquires": acquires,
+        "timeouts": pool_stats["timeouts"],
+        "pings": pool_stats["pings"],
+        "wait_avg_seconds": pool_stats["wait_total_seconds"] / acquires if acquires else 0.0,
+        "wait_max_seconds": pool_stats["wait_max_seconds"],
+        "replicas": [
+            {
+                "host": host,
+                "healthy": healthy,
+                "size": replica_pool.size if replica_pool else 0,
+                "free": replica_pool.freesize if replica_pool else 0,
+            }
+            for host, healthy, replica_pool in zip(replica_hosts, replica_healthy, replica_pools)
+        ],
+    }
+
+# LazyConnection クラスは、最初のSQL実行時にだけプールから接続を取得し、
+# 文またはトランザクションが終わった時点で接続をプールへ返却する接続ハンドルです。
+# トランザクション外の読み取りはレプリカへ、書き込みとそれ以降の読み取りはプライマリへ送ります。
+class LazyConnection:
+
+    def __init__(self):
+        self._pool = None
+        self._conn = None
+        self._cursor = None
+        self.in_transaction = False
+        self.wrote = False
+
+    # 接続を取得（取得済みの場合はそのまま返す）
+    async def acquire(
+        self,
+        readonly: bool = False
+    ) -> aiomysql.DictCursor:
+        if self._cursor is None:
+            readonly = readonly and not self.wrote and not self.in_transaction
+            self._pool, self._conn = await acquire_conn(readonly=readonly)
+            self._cursor = await self._conn.cursor(aiomysql.DictCursor)
+        return self._cursor
+
+    # 接続をプールへ返却
+    async def release(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            await self._cursor.close()
+        finally:
+            self._pool.release(self._conn)
+            self._pool = None
+            self._conn = None
+            self._cursor = None
+
+    # トランザクション開始（コミットまたはロールバックまで接続を保持する）
+    async def begin(self) -> None:
+        await self.acquire()
+        await self._conn.begin()
+        self.in_transaction = True
+        self.wrote = True
+
+    async def commit(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            await self._conn.commit()
+        finally:
+            self.in_transaction = False
+            await self.release()
+
+    async def rollback(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            await self._conn.rollback()
+        finally:
+            self.in_transaction = False
+            await self.release()
+
+# LazyCursor クラスは、DictCursor と同じAPIを持つカーソルです。
+# トランザクション外では実行結果を読み切った時点で接続を返却します。
+class LazyCursor:
+
+    def __init__(
+        self,
+        conn: LazyConnection
+    ):
+        self._conn = conn
+        self._rows: list[dict] = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    async def _run(self, method: str, sql: str, args, primary: bool = False) -> int:
+        select = method == "execute" and sql.lstrip()[:6].upper() == "SELECT"
+        if not select:
+            self._conn.wrote = True
+        cursor = await self._conn.acquire(readonly=select and not primary)
+        start = time.perf_counter()
+        try:
+            result = await getattr(cursor, method)(sql, args)
+            self._rows = list(await cursor.fetchall() or [])
+            self.rowcount = cursor.rowcount
+            self.lastrowid = cursor.lastrowid
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            record_sql(sql, elapsed)
+            db_query_duration_seconds.observe(elapsed, query_method.get())
+            if not self._conn.in_transaction:
+                await self._conn.release()
+
+    # primary=True の場合はトランザクション外の読み取りでもプライマリへ送る（レプリカの遅延が許されない読み取り用）
+    async def execute(self, sql: str, args=None, primary: bool = False) -> int:
+        return await self._run("execute", sql, args, primary)
+
+    async def executemany(self, sql: str, args) -> int:
+        return await self._run("executemany", sql, args)
+
+    async def fetchone(self) -> dict | None:
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchmany(self, size: int = 1) -> list[dict]:
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    async def fetchall(self) -> list[dict]:
+        rows, self._rows = self._rows, []
+        return rows
+
+# 接続とカーソルを取得する非同期ジェネレータ
+# 接続はSQLを実行するまで取得しないため、SQLを使わないリクエストはプールに触れません。
 async def get_conn_and_cursor():
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            yield conn, cursor
\ No newline at end of file
+    conn = LazyConnection()
+    try:
+        yield conn, LazyCursor(conn)
+    finally:
+        if conn.in_transaction:
+            await conn.rollback()
+        await conn.release()
+
+# ストリーミング読み出し用のサーバーサイドカーソルを取得する（レプリカ優先）
+@asynccontextmanager
+async def get_stream_cursor():
+    db_pool, conn = await acquire_conn(readonly=True)
+    try:
+        async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+            yield cursor
+    finally:
+        db_pool.release(conn)
@@ -0,0 +1,26 @@
+import hmac
+from fastapi import Header, HTTPException, status
+
+from src.config import get_settings
+
+# 設定された共有トークンと照合する（未設定の場合はエンドポイント自体を無効（404）にする）
+def check_shared_token(
+    value: str | None,
+    expected: str | None
+) -> None:
+    if expected is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if value is None or not hmac.compare_digest(value.encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+# 運用向けエンドポイントを ADMIN_TOKEN を知っている呼び出し元だけに制限する
+def require_admin_token(
+    x_admin_token: str | None = Header(default=None)
+) -> None:
+    check_shared_token(x_admin_token, get_settings().ADMIN_TOKEN)
+
+# トークン検証エンドポイントを INTROSPECT_CLIENT_TOKEN を知っているAPIサーバーだけに制限する
+def require_introspect_client(
+    x_introspect_token: str | None = Header(default=None)
+) -> None:
+    check_shared_token(x_introspect_token, get_settings().INTROSPECT_CLIENT_TOKEN)
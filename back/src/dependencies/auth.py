@@ -1,14 +1,21 @@
+from functools import lru_cache
+import hashlib
+import time
 from typing import Tuple
 from fastapi import Cookie, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
-from aiomysql import Connection, DictCursor
 from jose.exceptions import JWTError
 import logging
 
-from src.config import Settings, get_settings
-from src.db import get_conn_and_cursor
+from src.cache import TTLCache
+from src.config import get_settings
+from src.metrics import jwt_duration_seconds
+from src.timing import get_db_seconds, record_auth
+from src.revocation import is_revoked
+from src.keyring import get_keyring
+from src.db import LazyConnection, LazyCursor, get_conn_and_cursor
 from src.repositories.user import UserRepo
+from src.security import ACCESS_TOKEN_TYPE
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -18,15 +25,50 @@ credentials_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
-# ロガーの初期化
+# ロガーの初期化（出力先は src.logging_config で一括設定する）
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-# ログ出力フォーマットの設定
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-# コンソールへの出力ハンドラー
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+
+# プリンシパルキャッシュ（sub クレームをキーにユーザー情報を保持）
+@lru_cache
+def get_principal_cache() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(
+        maxsize=settings.PRINCIPAL_CACHE_SIZE,
+        ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+    )
+
+# 検証済みトークンキャッシュ（トークンのダイジェストをキーにペイロードを保持）
+@lru_cache
+def get_token_cache() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(
+        maxsize=settings.TOKEN_CACHE_SIZE if settings.TOKEN_CACHE_ENABLED else 0,
+        ttl=0
+    )
+
+# トークンを検証してペイロードを取得（検証済みのトークンはキャッシュから返す）
+def decode_token(
+    token: str
+) -> dict:
+    token_cache = get_token_cache()
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    start = time.perf_counter()
+    try:
+        payload = get_keyring().verify(token)
+    finally:
+        jwt_duration_seconds.observe(time.perf_counter() - start, "decode")
+
+    # トークン自身の有効期限までキャッシュする
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = exp - time.time()
+        if ttl > 0:
+            token_cache.set(key, payload, ttl=ttl)
+    return payload
 
 # アクセストークンをクッキーから取得
 def get_access_token_from_cookie(
@@ -62,33 +104,51 @@ def get_refresh_token_from_cookie(
 
 # 現在のユーザー情報を取得する
 async def get_cur_user(
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor),
-    settings: Settings = Depends(get_settings),    
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor),
     token: str = Depends(get_access_token_from_cookie)
 ):
+    start = time.perf_counter()
+    db_start = get_db_seconds()
     try:
         # トークンをデコード（有効期限も自動敵に検証する）
-        payload = jwt.decode(
-            token=token,
-            key=settings.TOKEN_SECRET_KEY,
-            algorithms=settings.TOKEN_ALGORITHM
-        )
+        payload = decode_token(token)
         email = payload.get("sub")
 
         # メール番号があるか検証
         if email is None:
-            logger.warning(f"Authentication failed: Missing email in token. Token: {token}")
+            logger.warning("Authentication failed: missing sub claim")
+            raise credentials_exception
+
+        # アクセストークン以外（リフレッシュトークンなど）を拒否
+        if payload.get("typ") != ACCESS_TOKEN_TYPE:
+            logger.warning("Authentication failed: not an access token", extra={"email": email})
             raise credentials_exception
         
-        # ユーザーを検証
         conn, cursor = conn_cursor
+
+        # 失効済みのトークンを拒否（ほとんどの場合はブルームフィルターだけで判定できる）
+        if await is_revoked(cursor, payload.get("jti")):
+            logger.warning("Authentication failed: revoked token", extra={"email": email})
+            raise credentials_exception
+
+        # キャッシュにあればDBを参照しない
+        principal_cache = get_principal_cache()
+        user = principal_cache.get(email)
+        if user is not None:
+            return user
+
+        # ユーザーを検証（キャッシュに載せるため、無効化直後にレプリカから古い行を読まないようプライマリから取得）
         user_repo = UserRepo(cursor)
-        user = await user_repo.get(email=email)
+        user = await user_repo.get(email=email, primary=True)
         if not user:
-            logger.warning(f"Authentication failed: User not found for email: {email}")
+            logger.warning("Authentication failed: user not found", extra={"email": email})
             raise credentials_exception
         
+        principal_cache.set(email, user)
         return user
     except JWTError as err:
-        logger.warning(f"Authentication failed: Invalid token. Error: {err}. Token: {token}")
+        logger.warning("Authentication failed: invalid token", extra={"error": str(err)})
         raise credentials_exception
+    finally:
+        # プリンシパルや失効の確認にかかったSQLの時間は db に計上済みのため除く
+        record_auth(time.perf_counter() - start - (get_db_seconds() - db_start))
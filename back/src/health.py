@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import time
+
+from src import security
+from src.keyring import get_keyring
+from src.schemas.token import TokenPayload
+from src.schemas.user import UserOut, UserOutDB, UserBulkOut
+
+logger = logging.getLogger(__name__)
+
+# アプリケーションの稼働状態（/readyz で参照する）
+#   draining:  停止シグナルを受けた（/readyz は 503 を返すが、リクエストは引き続き処理する）
+#   accepting: 新しいリクエストを処理する（猶予期間が終わり uvicorn が停止を始めたら False）
+app_state = {
+    "warmed_up": False,
+    "draining": False,
+    "accepting": True,
+    "in_flight": 0,
+    "aborted": 0,
+}
+
+# 停止シグナルを受けた時刻
+drain_started: float | None = None
+
+# 停止処理中も受け付けるパス
+DRAIN_EXEMPT_PATHS = ("/healthz", "/readyz", "/metrics")
+
+# InFlightMiddleware クラスは、処理中のリクエスト数を数え、停止処理中は新しいリクエストを503で拒否するASGIミドルウェアです。
+# uvicorn が停止時の待ち時間（timeout_graceful_shutdown）を過ぎてキャンセルしたリクエストは aborted として数えます。
+class InFlightMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in DRAIN_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if not app_state["accepting"]:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", b"1"),
+                    (b"connection", b"close"),
+                ],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": json.dumps({"detail": "サーバーは停止処理中です"}, ensure_ascii=False).encode(),
+            })
+            return
+
+        app_state["in_flight"] += 1
+        try:
+            await self.app(scope, receive, send)
+        except asyncio.CancelledError:
+            if not app_state["accepting"]:
+                app_state["aborted"] += 1
+            raise
+        finally:
+            app_state["in_flight"] -= 1
+
+# 停止処理の流れ（シグナルの受け取りは src.launcher のワーカーが行う）
+#   1. 停止シグナルを受けたら begin_drain() で /readyz を 503 にし、DRAIN_GRACE_SECONDS の間は通常どおり処理を続ける
+#      （ロードバランサーが振り分け先から外すまでの猶予）
+#   2. 猶予期間が終わったら stop_accepting() で新しいリクエストを拒否し、uvicorn の停止処理に進む
+#      uvicorn は待ち受けを閉じ、処理中のリクエストを最大 DRAIN_TIMEOUT_SECONDS（timeout_graceful_shutdown）待つ
+#   3. lifespan の終了処理で finish_drain() が所要時間と打ち切られたリクエスト数を記録する
+# uvicorn を直接起動した場合は 1 と 2 が行われないため、--timeout-graceful-shutdown で待ち時間だけを指定する
+
+# 停止シグナルを受けたときに呼ぶ関数（シグナルハンドラーから呼ぶためログは出さない）
+def begin_drain() -> None:
+    global drain_started
+    if drain_started is None:
+        drain_started = time.perf_counter()
+    app_state["draining"] = True
+
+# 猶予期間が終わり、新しいリクエストの受け付けを止める関数
+def stop_accepting() -> None:
+    app_state["draining"] = True
+    app_state["accepting"] = False
+    logger.info("drain: 新しいリクエストの受け付けを停止しました", extra={
+        "in_flight": app_state["in_flight"],
+    })
+
+# 停止処理の結果を記録する関数（lifespan の終了処理で呼ぶ）
+def finish_drain() -> None:
+    app_state["draining"] = True
+    app_state["accepting"] = False
+    logger.info("drain: 処理中のリクエストの完了を待ちました", extra={
+        "drain_seconds": round(time.perf_counter() - drain_started, 3) if drain_started else None,
+        "aborted": app_state["aborted"],
+    })
+
+# 停止状態を初期化する関数（起動時に呼ぶ）
+def reset_drain() -> None:
+    global drain_started
+    drain_started = None
+    app_state["draining"] = False
+    app_state["accepting"] = True
+    app_state["in_flight"] = 0
+    app_state["aborted"] = 0
+
+# 初回利用時のコストを起動時に前払いしておく関数
+async def warm_up() -> None:
+    # bcrypt のバックエンドを読み込み、全ワーカープロセスを起動しておく
+    hashed = await asyncio.to_thread(security.get_hashed_pw, "warm-up")
+    workers = security.get_hash_pool_stats()["workers"] or 1
+    await asyncio.gather(*[
+        security.verify_pw_async("warm-up", hashed) for _ in range(workers)
+    ])
+
+    # JWT の署名と検証を一度実行しておく
+    token, _ = security.create_access_token(payload=TokenPayload(sub="warm-up"))
+    get_keyring().verify(token)
+
+    # pydantic のバリデーションとシリアライズを一度実行しておく
+    user = UserOutDB(email="warm-up", pw=hashed)
+    UserOut(email=user.email, pw=user.pw).model_dump_json(by_alias=True)
+    UserBulkOut(created=0, duplicates=0, failed=0, results=[]).model_dump_json(by_alias=True)
+
+    app_state["warmed_up"] = True
+    logger.info("warm_up: ウォームアップが完了しました", extra={"hash_workers": workers})
@@ -0,0 +1,98 @@
+from functools import lru_cache
+from pathlib import Path
+
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWTError
+
+from src.config import get_settings
+
+# 非対称鍵で署名する場合に使用できるアルゴリズム
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512")
+
+# SigningKey クラスは、kid ごとに読み込み済みの鍵を保持します。
+# private が None の鍵は検証専用（ローテーションで退役した鍵など）です。
+class SigningKey:
+
+    def __init__(
+        self,
+        kid: str,
+        algorithm: str,
+        private: Key | None,
+        public: Key
+    ):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private = private
+        self.public = public
+
+    # JWKS に公開する形式
+    def to_jwk(self) -> dict:
+        return {
+            **self.public.to_dict(),
+            "kid": self.kid,
+            "alg": self.algorithm,
+            "use": "sig",
+        }
+
+# "kid:ALG:path" をカンマ区切りで並べた設定値を読み込む
+def _load_keys(spec: str, private: bool) -> list[SigningKey]:
+    keys = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        kid, algorithm, path = entry.split(":", 2)
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ValueError(f"未対応の署名アルゴリズムです: {algorithm}（{', '.join(ASYMMETRIC_ALGORITHMS)} のいずれかを指定してください）")
+        key = jwk.construct(Path(path).read_text(), algorithm)
+        public = key.public_key() if private else key
+        keys.append(SigningKey(kid, algorithm, key if private else None, public))
+    return keys
+
+# KeyRing クラスは、起動時に一度だけ読み込んだ鍵でトークンの署名と検証を行います。
+# TOKEN_SIGNING_KEYS が設定されていない場合は従来どおり TOKEN_SECRET_KEY による HMAC で署名します。
+class KeyRing:
+
+    def __init__(self):
+        settings = get_settings()
+        signing = _load_keys(settings.TOKEN_SIGNING_KEYS, private=True)
+        verify_only = _load_keys(settings.TOKEN_VERIFY_KEYS, private=False)
+        self.keys: dict[str, SigningKey] = {key.kid: key for key in verify_only + signing}
+
+        self.active: SigningKey | None = None
+        if signing:
+            active_kid = settings.TOKEN_ACTIVE_KID or signing[0].kid
+            self.active = self.keys[active_kid]
+            if self.active.private is None:
+                raise ValueError(f"署名用の秘密鍵がありません: {active_kid}")
+
+        self.secret = settings.TOKEN_SECRET_KEY
+        self.secret_algorithm = settings.TOKEN_ALGORITHM
+
+    # クレームに署名してトークンを作成
+    def sign(self, claims: dict) -> str:
+        if self.active is None:
+            return jwt.encode(claims, self.secret, self.secret_algorithm)
+        return jwt.encode(
+            claims,
+            self.active.private,
+            self.active.algorithm,
+            headers={"kid": self.active.kid}
+        )
+
+    # トークンを検証してクレームを取得（ヘッダーの kid で鍵を選ぶ）
+    def verify(self, token: str) -> dict:
+        if self.active is None:
+            return jwt.decode(token=token, key=self.secret, algorithms=self.secret_algorithm)
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.keys.get(kid) if kid else self.active
+        if key is None:
+            raise JWTError(f"Unknown key id: {kid}")
+        return jwt.decode(token=token, key=key.public, algorithms=[key.algorithm])
+
+    # 公開鍵の一覧（JWKS）
+    def jwks(self) -> dict:
+        return {"keys": [key.to_jwk() for key in self.keys.values()]}
+
+@lru_cache
+def get_keyring() -> KeyRing:
+    return KeyRing()
@@ -0,0 +1,226 @@
+"""
+本番用の起動スクリプト
+
+ワーカープロセスを N 個起動し、データベース接続数の上限（全体の予算）をワーカー間で分配します。
+ワーカーが異常終了した場合は再起動します。
+SIGTERM を受けると、各ワーカーは /readyz を 503 にして DRAIN_GRACE_SECONDS の間処理を続け、
+その後 DRAIN_TIMEOUT_SECONDS まで処理中のリクエストを待ってから終了します。
+
+使い方（back ディレクトリで実行）:
+    python -m src.launcher --host 0.0.0.0 --port 8000 --db-budget 100
+    python -m src.launcher --workers 4 --db-budget 60 --print-plan
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# ワーカーの再起動の待ち時間（起動から RESTART_STABLE_SECONDS 未満で終了した場合に倍々に延ばす）
+RESTART_STABLE_SECONDS = 30.0
+RESTART_BASE_DELAY_SECONDS = 0.5
+RESTART_MAX_DELAY_SECONDS = 60.0
+
+# ワーカー1つあたりの構成
+@dataclass
+class WorkerPlan:
+    workers: int
+    db_pool_minsize: int
+    db_pool_maxsize: int
+    pw_hash_workers: int
+    # 起動前に1回だけ計測した bcrypt のコスト（None の場合はワーカーの設定に従う）
+    pw_hash_rounds: int | None = None
+
+    # ワーカーへ渡す環境変数
+    def env(self) -> dict[str, str]:
+        env = {
+            "DB_POOL_MINSIZE": str(self.db_pool_minsize),
+            "DB_POOL_MAXSIZE": str(self.db_pool_maxsize),
+            "PW_HASH_WORKERS": str(self.pw_hash_workers),
+        }
+        if self.pw_hash_rounds is not None:
+            # 計測済みのコストを全ワーカーで使い、ワーカーごとの計測は行わない
+            env["PW_HASH_ROUNDS"] = str(self.pw_hash_rounds)
+            env["PW_HASH_CALIBRATE"] = "false"
+        return env
+
+# 起動構成を計算する関数
+def make_plan(
+    workers: int | None,
+    db_budget: int,
+    db_pool_minsize: int,
+    cpus: int | None = None
+) -> WorkerPlan:
+    if db_budget < 1:
+        raise ValueError("db_budget は1以上を指定してください")
+    cpus = cpus or os.cpu_count() or 1
+    # 各ワーカーに最低1本の接続が必要なため、ワーカー数は接続の予算を超えないようにする
+    workers = min(workers or cpus, db_budget)
+    maxsize = db_budget // workers
+    return WorkerPlan(
+        workers=workers,
+        db_pool_minsize=min(db_pool_minsize, maxsize),
+        db_pool_maxsize=maxsize,
+        # bcrypt 用のプロセスはCPUコアを全ワーカーで分け合う
+        pw_hash_workers=max(1, cpus // workers),
+    )
+
+# 起動構成を表示する関数
+def print_plan(plan: WorkerPlan, db_budget: int, replicas: int) -> None:
+    pools = 1 + replicas
+    print(f"workers:                 {plan.workers}")
+    print(f"db pool per worker:      min={plan.db_pool_minsize} max={plan.db_pool_maxsize} (x{pools} pools)")
+    print(f"db connections (total):  {plan.workers * plan.db_pool_maxsize} per server / budget {db_budget}")
+    print(f"bcrypt processes/worker: {plan.pw_hash_workers}")
+    print(f"processes (total):       {plan.workers * (1 + plan.pw_hash_workers) + 1}")
+
+# 停止シグナルを受けてもすぐには止まらない uvicorn.Server を作成する関数
+# シグナルを受けたら /readyz を 503 にし、grace 秒の間は通常どおり処理を続けてから uvicorn の停止処理に進む
+# 2回目の SIGINT では猶予期間を待たずに停止する
+def make_server(config, grace: float):
+    import uvicorn
+    from src.health import begin_drain, stop_accepting
+
+    class DrainingServer(uvicorn.Server):
+        drain_started: float | None = None
+
+        def handle_exit(self, sig, frame) -> None:
+            if self.drain_started is None:
+                self.drain_started = time.monotonic()
+                begin_drain()
+            super().handle_exit(sig, frame)
+
+        async def on_tick(self, counter: int) -> bool:
+            should_exit = await super().on_tick(counter)
+            if not should_exit or self.drain_started is None:
+                return should_exit
+            if not self.force_exit and time.monotonic() - self.drain_started < grace:
+                return False
+            stop_accepting()
+            return True
+
+    return DrainingServer(config)
+
+# ワーカープロセスの処理
+def run_worker(sock: socket.socket, env: dict[str, str], log_level: str) -> None:
+    import uvicorn
+
+    os.environ.update(env)
+    from src.config import get_settings
+    settings = get_settings()
+    config = uvicorn.Config(
+        "src.main:app",
+        log_level=log_level,
+        access_log=False,
+        timeout_graceful_shutdown=settings.DRAIN_TIMEOUT_SECONDS
+    )
+    server = make_server(config, settings.DRAIN_GRACE_SECONDS)
+    server.run(sockets=[sock])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="本番用の起動スクリプト")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="既定はCPUコア数")
+    parser.add_argument("--db-budget", type=int, default=int(os.getenv("DB_CONNECTION_BUDGET", "100")),
+                        help="このサーバー全体で使ってよいデータベース接続数")
+    parser.add_argument("--db-pool-minsize", type=int, default=int(os.getenv("DB_POOL_MINSIZE", "1")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--print-plan", action="store_true", help="起動構成を表示して終了する")
+    args = parser.parse_args(argv)
+
+    try:
+        plan = make_plan(args.workers, args.db_budget, args.db_pool_minsize)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.workers and plan.workers < args.workers:
+        print(f"warning: --workers {args.workers} exceeds --db-budget {args.db_budget}; using {plan.workers} workers")
+    replicas = len([h for h in os.getenv("MYSQL_REPLICA_HOSTS", "").split(",") if h.strip()])
+    print_plan(plan, args.db_budget, replicas)
+    if args.print_plan:
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    # PW_HASH_CALIBRATE の場合は、ワーカーが同時に計測してCPUを奪い合わないよう起動前に1回だけ計測する
+    from src.config import get_settings
+    settings = get_settings()
+    if settings.PW_HASH_CALIBRATE:
+        from src.security import calibrate_pw_rounds
+        plan.pw_hash_rounds = calibrate_pw_rounds(
+            settings.PW_HASH_TARGET_MS,
+            settings.PW_HASH_MIN_ROUNDS,
+            settings.PW_HASH_MAX_ROUNDS
+        )
+        logger.info("calibrated bcrypt rounds: %d", plan.pw_hash_rounds)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.set_inheritable(True)
+
+    ctx = multiprocessing.get_context("spawn")
+    env = plan.env()
+    shutting_down = False
+
+    def spawn():
+        process = ctx.Process(target=run_worker, args=(sock, env, args.log_level))
+        process.start()
+        return process
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes: list = [spawn() for _ in range(plan.workers)]
+    # 起動直後に終了を繰り返すワーカー（データベースに接続できないなど）は待ち時間を倍々に延ばして再起動する
+    started_at = [time.monotonic()] * plan.workers
+    failures = [0] * plan.workers
+    restart_at = [0.0] * plan.workers
+    logger.info("started %d workers on %s:%d", plan.workers, args.host, args.port)
+
+    # 異常終了したワーカーを再起動する
+    while not shutting_down:
+        time.sleep(0.5)
+        now = time.monotonic()
+        for i, process in enumerate(processes):
+            if shutting_down:
+                break
+            if process is None:
+                if now >= restart_at[i]:
+                    processes[i] = spawn()
+                    started_at[i] = now
+                continue
+            if process.is_alive():
+                continue
+            # 一定時間以上動いていたワーカーはすぐに再起動し、起動直後の終了は失敗として数える
+            if now - started_at[i] < RESTART_STABLE_SECONDS:
+                failures[i] += 1
+            else:
+                failures[i] = 0
+            delay = min(RESTART_MAX_DELAY_SECONDS, RESTART_BASE_DELAY_SECONDS * (2 ** failures[i])) if failures[i] else 0.0
+            logger.warning("worker pid=%s exited with %s, restarting in %.1fs", process.pid, process.exitcode, delay)
+            processes[i] = None
+            restart_at[i] = now + delay
+
+    # ワーカーは SIGTERM を受けてから DRAIN_GRACE_SECONDS の間は処理を続け、その後 DRAIN_TIMEOUT_SECONDS まで処理中のリクエストを待つ
+    # 親プロセスの待ち受けソケットは先に閉じ、ワーカーが待ち受けを閉じた時点で新しい接続が拒否されるようにする
+    processes = [process for process in processes if process is not None]
+    for process in processes:
+        process.terminate()
+    sock.close()
+    for process in processes:
+        process.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
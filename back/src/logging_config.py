@@ -0,0 +1,123 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# ログ出力の対象となるロガーツリーのルート
+ROOT_LOGGER = "src"
+
+# LogRecord の標準属性（これ以外の属性は extra として JSON に出力する）
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# JsonFormatter クラスは、ログを1行のJSONとして出力するフォーマッターです。
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# RateLimitFilter クラスは、呼び出し箇所ごとに1秒あたりの出力件数を制限するフィルターです。
+# ERROR 以上のログは制限しません。抑制した件数は次に出力するログの suppressed に記録します。
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        # (ロガー名, 行番号) -> [トークン数, 最終更新時刻, 抑制件数]
+        self._buckets: dict[tuple[str, int], list[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR or self.per_second <= 0:
+            return True
+
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.per_second, now, 0]
+
+        tokens = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return False
+
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed = int(bucket[2])
+            bucket[2] = 0
+        return True
+
+# DroppingQueueHandler クラスは、キューが満杯の場合にログを破棄してリクエスト処理を止めないハンドラーです。
+class DroppingQueueHandler(QueueHandler):
+
+    dropped = 0
+
+    # 既定の prepare はメッセージに例外の内容まで埋め込んで exc_info を消すため、JsonFormatter の exc に出力されない
+    # ここではメッセージの組み立てと例外の文字列化だけを行い、例外は exc_text として渡す
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+listener: QueueListener | None = None
+
+# ロガーツリーを初期化する関数
+# ログはキュー経由で別スレッドから標準エラー出力へ JSON で書き出されます。
+def setup_logging(
+    level: int | str = logging.INFO,
+    rate_limit_per_second: float = 10.0,
+    queue_size: int = 10000
+) -> None:
+    global listener
+    if listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit_per_second))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+
+# キューに残ったログを書き出してリスナーを停止する関数
+def stop_logging() -> None:
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
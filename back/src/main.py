@@ -1,21 +1,24 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.routing import APIRoute
-from src.routers import user, login
+from src.routers import user, login, stats, metrics, health, introspect, jwks
+from src.keyring import get_keyring
+from src.health import InFlightMiddleware, app_state, finish_drain, reset_drain, warm_up
+from src.metrics import MetricsMiddleware
+from src.profiler import profiler_middleware
+from src.timing import ServerTimingMiddleware
+from src.admission import AdmissionMiddleware
+from src.revocation import init_revocation, close_revocation
 
-from src.db import init_db_pool, get_pool
+from src.db import init_db_pool, get_pool, close_replica_pools
+from src.security import init_hash_pool, close_hash_pool, init_pw_ctx
+from src.config import get_settings
+from src.logging_config import setup_logging
 import logging
 
-# ログの設定
-logger = logging.getLogger("orion2")
-logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-formatter = logging.Formatter(
-    "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
-)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = logging.getLogger(__name__)
 
 # スネークケースの文字列をキャメルケースに変換する関数
 def snake_case_to_camel_case(snake_case_str: str) -> str:
@@ -29,11 +32,30 @@ def use_route_names_as_operation_ids(app: FastAPI) -> None:
             route.operation_id = snake_case_to_camel_case(route.name)
 # 初期化
 async def init_app():
+    reset_drain()
+    # ログの設定（キュー経由で別スレッドから出力する）
+    settings = get_settings()
+    setup_logging(
+        level=settings.LOG_LEVEL,
+        rate_limit_per_second=settings.LOG_RATE_LIMIT_PER_SECOND
+    )
+    # 署名鍵は起動時に一度だけ読み込む（設定に誤りがあれば起動を中止する）
+    keyring = get_keyring()
+    logger.info("init_app: 署名鍵を読み込みました", extra={"kids": list(keyring.keys)})
     await init_db_pool()
     logger.info("init_app: データベースコネクションプールが初期化されました")
+    await init_revocation()
+    rounds = await asyncio.to_thread(init_pw_ctx)
+    logger.info(f"init_app: bcrypt のコストを {rounds or '既定値'} に設定しました")
+    init_hash_pool()
+    logger.info("init_app: パスワードハッシュ用プロセスプールが初期化されました")
+    await warm_up()
 
 # 終了
 async def close_app():
+    # 処理中のリクエストは uvicorn の停止処理で待ち終えているため、結果を記録してからプールを閉じる
+    finish_drain()
+    app_state["warmed_up"] = False
     try:
         pool = get_pool()
         logger.debug(f"close_app: プールの状態: {pool}")
@@ -45,6 +67,10 @@ async def close_app():
             logger.info("データベースコネクションプールは初期化されていません")
     except Exception as e:
         logger.error(f"データベースコネクションプールのクローズ中にエラーが発生しました: {e}")
+    await close_revocation()
+    await close_replica_pools()
+    close_hash_pool()
+    logger.info("パスワードハッシュ用プロセスプールが正常に閉じられました")
 
 # FastAPIのライフサイクルイベントを使用して、アプリケーションの初期化と終了処理を行います。
 @asynccontextmanager
@@ -62,17 +88,29 @@ origins = [
     "http://127.0.0.1:5173",
 ]
 
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(InFlightMiddleware)
+app.add_middleware(profiler_middleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_methods=["POST", "GET", "PUT", "DELETE"],
     allow_credentials=True,
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["X-Next-After", "ETag", "Server-Timing"]
 )
 
 # ルーターのインポート
 app.include_router(user.router)
 app.include_router(login.router)
+app.include_router(stats.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
+app.include_router(introspect.router)
+app.include_router(jwks.router)
 
 # 操作IDをルート名として使用する
 use_route_names_as_operation_ids(app)
\ No newline at end of file
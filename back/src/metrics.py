@@ -0,0 +1,166 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+
+# 既定のヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ラベルの組を Prometheus のテキスト形式に変換する
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+# Counter クラスは、ラベルごとに単調増加する値を保持するメトリクスです。
+class Counter:
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+# Histogram クラスは、ラベルごとに観測値の分布を累積バケットで保持するメトリクスです。
+class Histogram:
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # ラベルの組 -> [バケットごとの件数..., +Inf の件数, 合計]
+        self._values: dict[tuple, list[float]] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *label_values) -> None:
+        data = self._values.get(label_values)
+        if data is None:
+            data = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, data in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, label_values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {data[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+# 登録済みのメトリクス
+REGISTRY: list = []
+
+# 計測用のメトリクス
+http_requests_total = Counter(
+    "http_requests_total", "Total HTTP requests", ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+db_acquire_wait_seconds = Histogram(
+    "db_acquire_wait_seconds", "Time spent waiting for a pooled DB connection"
+)
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "SQL time per statement after connection acquire, by repository method", ("method",)
+)
+admission_rejected_total = Counter(
+    "admission_rejected_total", "Requests shed by admission control before routing", ("class",)
+)
+pw_hash_duration_seconds = Histogram(
+    "pw_hash_duration_seconds", "bcrypt verify/hash duration including queueing", ("op",)
+)
+jwt_duration_seconds = Histogram(
+    "jwt_duration_seconds", "JWT encode/decode duration", ("op",),
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+)
+
+# 実行中のリポジトリのメソッド名（db_query_duration_seconds のラベル）
+query_method: ContextVar[str] = ContextVar("query_method", default="other")
+
+# リポジトリのメソッド名を SQL の実行時間のラベルとして設定するデコレーター
+# 時間は接続の取得後に LazyCursor が計測する（プールの待ち時間は db_acquire_wait_seconds に記録される）
+def query_label(name: str):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = query_method.set(name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                query_method.reset(token)
+        return wrapper
+    return decorator
+
+# MetricsMiddleware クラスは、ルートごとのリクエスト数と処理時間を記録するASGIミドルウェアです。
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # ルーティング後のパステンプレートをラベルにする（カーディナリティを抑えるため）
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_request_duration_seconds.observe(time.perf_counter() - start, method, path)
+            http_requests_total.inc(method, path, status_code)
+
+# 全メトリクスを Prometheus のテキスト形式で出力する
+def render_metrics(gauges: dict[str, float] | None = None) -> str:
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    # ラベル付きのゲージ（"name{label=...}"）は同じ名前ごとに TYPE を1回だけ出力する
+    typed: set[str] = set()
+    for name, value in (gauges or {}).items():
+        base = name.split("{", 1)[0]
+        if base not in typed:
+            typed.add(base)
+            lines.append(f"# TYPE {base} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,106 @@
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+from src.config import get_settings
+
+# ProfilerMiddleware クラスは、リクエストを cProfile で計測し、結果を .prof ファイルとして保存するASGIミドルウェアです。
+# 保存したファイルは pstats や snakeviz などの標準的なビューアで参照できます。
+# 次のいずれかに該当するリクエストのプロファイルを保存します。
+#   - PROFILER_SAMPLE_RATE の割合でサンプリングされたリクエスト
+#   - X-Profile ヘッダーに PROFILER_ADMIN_TOKEN が指定されたリクエスト
+#   - 処理時間が PROFILER_SLOW_THRESHOLD_MS を超えたパスへの、次回以降のリクエスト
+# 遅いリクエストの検出は処理時間の計測だけで行い、cProfile は有効にしません。
+# 遅かったパスを記録しておき、同じメソッド・パスへの次のリクエストを計測します（保存したら記録を消します）。
+# 注意: cProfile はイベントループのスレッド全体を計測するため、リクエストが await で中断している間に
+# 実行された他のリクエストの処理（bcrypt の待ち合わせ、SQL、pydantic など）もプロファイルに含まれます。
+# 同時実行数が少ない状態（X-Profile で単発のリクエストを送るなど）で計測した結果ほど正確です。
+# また cProfile は同一スレッドで同時に1つしか有効にできないため、計測中は他のリクエストを計測しません。
+class ProfilerMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self.sample_rate = settings.PROFILER_SAMPLE_RATE
+        self.slow_threshold = (
+            settings.PROFILER_SLOW_THRESHOLD_MS / 1000
+            if settings.PROFILER_SLOW_THRESHOLD_MS is not None else None
+        )
+        self.admin_token = settings.PROFILER_ADMIN_TOKEN.encode() if settings.PROFILER_ADMIN_TOKEN else None
+        self.dir = Path(settings.PROFILER_DIR)
+        self.max_files = settings.PROFILER_MAX_FILES
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.busy = False
+        # 遅かったリクエストのメソッドとパス（次のリクエストを計測する）
+        self.armed: set[tuple[str, str]] = set()
+        self.max_armed = 100
+
+    # 管理者用ヘッダーによる計測指定かどうか
+    def is_forced(self, scope) -> bool:
+        if self.admin_token is None:
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, self.admin_token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["method"], scope["path"])
+        profile = not self.busy and (
+            self.is_forced(scope)
+            or key in self.armed
+            or random.random() < self.sample_rate
+        )
+        if not profile:
+            await self.measure(scope, receive, send, key)
+            return
+
+        self.busy = True
+        self.armed.discard(key)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.disable()
+            self.busy = False
+            elapsed = time.perf_counter() - start
+            await asyncio.to_thread(self.save, profiler, scope, elapsed)
+
+    # 計測しないリクエストは処理時間だけを測り、遅い場合は次のリクエストを計測するよう記録する
+    async def measure(self, scope, receive, send, key: tuple[str, str]) -> None:
+        if self.slow_threshold is None:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if time.perf_counter() - start >= self.slow_threshold and len(self.armed) < self.max_armed:
+                self.armed.add(key)
+
+    # プロファイルを保存し、上限を超えた古いファイルを削除する
+    def save(self, profiler: cProfile.Profile, scope, elapsed: float) -> None:
+        path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{path}-{int(elapsed * 1000)}ms.prof"
+        profiler.dump_stats(self.dir / name)
+
+        files = sorted(self.dir.glob("*.prof"), key=os.path.getmtime)
+        for old in files[:-self.max_files]:
+            old.unlink(missing_ok=True)
+
+# 設定に応じてプロファイラーを組み込む（無効の場合はアプリをそのまま返すため負荷はかからない）
+def profiler_middleware(app):
+    if not get_settings().PROFILER_ENABLED:
+        return app
+    return ProfilerMiddleware(app)
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from src.db import LazyCursor
+from src.metrics import query_label
+
+# RevokedTokenRepo クラスは、失効したトークン（jti）のデータベース操作を行うリポジトリです。
+# テーブル定義:
+#   CREATE TABLE revoked_tokens (
+#       id BIGINT AUTO_INCREMENT PRIMARY KEY,
+#       jti CHAR(32) NOT NULL UNIQUE,
+#       expires_at DATETIME NOT NULL,
+#       INDEX (expires_at)
+#   );
+# 失効の確認と同期はレプリカの遅延で失効済みのトークンを見逃さないよう、常にプライマリから読み取ります。
+class RevokedTokenRepo:
+
+    def __init__(
+        self,
+        cur: LazyCursor
+    ):
+        self.cur = cur
+
+    # 失効したトークンを登録
+    @query_label("revoked_token_add")
+    async def add(
+        self,
+        jti: str,
+        expires_at: datetime
+    ) -> None:
+
+        sql = """
+            INSERT IGNORE INTO revoked_tokens (
+                jti,
+                expires_at
+            ) VALUES (
+                %(jti)s,
+                %(expires_at)s
+            )
+        """
+
+        await self.cur.execute(sql, {
+            "jti": jti,
+            "expires_at": expires_at
+        })
+
+    # 失効しているかどうか
+    @query_label("revoked_token_exists")
+    async def exists(
+        self,
+        jti: str
+    ) -> bool:
+
+        sql = """
+            SELECT
+                1 AS found
+            FROM
+                revoked_tokens
+            WHERE
+                jti = %(jti)s
+        """
+
+        await self.cur.execute(sql, {
+            "jti": jti
+        }, primary=True)
+
+        return await self.cur.fetchone() is not None
+
+    # 指定したID以降に登録された有効期限内の失効トークンを取得
+    @query_label("revoked_token_get_since")
+    async def get_since(
+        self,
+        last_id: int,
+        now: datetime
+    ) -> list[dict]:
+
+        sql = """
+            SELECT
+                id,
+                jti,
+                expires_at
+            FROM
+                revoked_tokens
+            WHERE
+                id > %(last_id)s
+                AND expires_at > %(now)s
+            ORDER BY
+                id
+        """
+
+        await self.cur.execute(sql, {
+            "last_id": last_id,
+            "now": now
+        }, primary=True)
+
+        return await self.cur.fetchall()
+
+    # 有効期限切れの失効トークンを削除
+    @query_label("revoked_token_delete_expired")
+    async def delete_expired(
+        self,
+        now: datetime
+    ) -> int:
+
+        sql = """
+            DELETE FROM revoked_tokens
+            WHERE
+                expires_at <= %(now)s
+        """
+
+        await self.cur.execute(sql, {
+            "now": now
+        })
+
+        return self.cur.rowcount
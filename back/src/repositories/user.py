@@ -1,5 +1,9 @@
+from typing import AsyncIterator
 from aiomysql import DictCursor
 
+from src.db import LazyCursor
+from src.metrics import query_label
+
 from src.schemas.user import UserOutDB, UserInDB
 
 # UserRepo クラスは、ユーザー情報のデータベース操作を行うリポジトリです。
@@ -7,14 +11,29 @@ class UserRepo:
 
     def __init__(
         self,
-        cur: DictCursor
+        cur: DictCursor | LazyCursor
     ):
         self.cur = cur
 
+    # SQLを実行する（primary=True の場合はレプリカを使わない。LazyCursor のみ指定できる）
+    async def _execute(
+        self,
+        sql: str,
+        args,
+        primary: bool = False
+    ) -> None:
+        if primary:
+            await self.cur.execute(sql, args, primary=True)
+        else:
+            await self.cur.execute(sql, args)
+
     # ユーザー取得
+    # キャッシュに載せる行は primary=True で読み取る（レプリカの遅延で削除・更新前の行をキャッシュしないため）
+    @query_label("get")
     async def get(
         self,
-        email: str
+        email: str,
+        primary: bool = False
     ) -> UserOutDB:
         
         sql = """
@@ -27,9 +46,9 @@ class UserRepo:
                 email = %(email)s
         """
 
-        await self.cur.execute(sql, {
+        await self._execute(sql, {
             "email": email
-        })
+        }, primary)
 
         row =  await self.cur.fetchone()
  
@@ -38,7 +57,36 @@ class UserRepo:
         
         return UserOutDB(**row)
     
+    # 複数のユーザーを1回のクエリで取得
+    @query_label("get_many")
+    async def get_many(
+        self,
+        emails: list[str],
+        primary: bool = False
+    ) -> dict[str, UserOutDB]:
+
+        if not emails:
+            return {}
+
+        placeholders = ", ".join(["%s"] * len(emails))
+        sql = f"""
+            SELECT
+                email,
+                pw
+            FROM
+                users
+            WHERE
+                email IN ({placeholders})
+        """
+
+        await self._execute(sql, emails, primary)
+
+        rows = await self.cur.fetchall()
+
+        return {row["email"]: UserOutDB(**row) for row in rows}
+
     # ユーザー全件取得
+    @query_label("get_all")
     async def get_all(
         self
     ) -> list[UserOutDB]:
@@ -60,7 +108,121 @@ class UserRepo:
 
         return [UserOutDB(**row) for row in rows]
 
-    # ユーザー作成
+    # ユーザーをキーセット方式で取得（email の範囲スキャン）
+    @query_label("get_page")
+    async def get_page(
+        self,
+        after: str | None,
+        limit: int
+    ) -> list[UserOutDB]:
+
+        sql = """
+            SELECT
+                email,
+                pw
+            FROM
+                users
+            WHERE
+                email > %(after)s
+            ORDER BY
+                email
+            LIMIT %(limit)s
+        """
+
+        await self.cur.execute(sql, {
+            "after": after or "",
+            "limit": limit
+        })
+
+        rows = await self.cur.fetchall()
+
+        return [UserOutDB(**row) for row in rows]
+
+    # ユーザーのバージョン（email と pw のダイジェスト）を取得
+    @query_label("get_version")
+    async def get_version(
+        self,
+        email: str
+    ) -> str | None:
+
+        sql = """
+            SELECT
+                MD5(CONCAT(email, ':', pw)) AS version
+            FROM
+                users
+            WHERE
+                email = %(email)s
+        """
+
+        await self.cur.execute(sql, {
+            "email": email
+        })
+
+        row = await self.cur.fetchone()
+
+        return row["version"] if row else None
+
+    # ページ単位のバージョン（件数・最終行・各行のダイジェストのXOR）を取得
+    @query_label("get_page_version")
+    async def get_page_version(
+        self,
+        after: str | None,
+        limit: int
+    ) -> dict:
+
+        sql = """
+            SELECT
+                COUNT(*) AS count,
+                MAX(email) AS last_email,
+                BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT(email, ':', pw)), 16), 16, 10) AS UNSIGNED)) AS digest
+            FROM (
+                SELECT
+                    email,
+                    pw
+                FROM
+                    users
+                WHERE
+                    email > %(after)s
+                ORDER BY
+                    email
+                LIMIT %(limit)s
+            ) AS page
+        """
+
+        await self.cur.execute(sql, {
+            "after": after or "",
+            "limit": limit
+        })
+
+        return await self.cur.fetchone()
+
+    # ユーザーを1行ずつ取得（サーバーサイドカーソルと組み合わせて使用する）
+    async def iter_all(
+        self,
+        batch_size: int = 500
+    ) -> AsyncIterator[dict]:
+
+        sql = """
+            SELECT
+                email,
+                pw
+            FROM
+                users
+            ORDER BY
+                email
+        """
+
+        await self.cur.execute(sql)
+
+        while True:
+            rows = await self.cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+    # ユーザー作成（email の一意キー違反時は IntegrityError を送出する）
+    @query_label("create")
     async def create(
         self,
         user: UserInDB
@@ -80,11 +242,59 @@ class UserRepo:
             sql, user.model_dump()
         )
 
-    # ユーザー更新
+    # 登録済みのメールアドレスを取得
+    @query_label("get_existing_emails")
+    async def get_existing_emails(
+        self,
+        emails: list[str]
+    ) -> set[str]:
+
+        if not emails:
+            return set()
+
+        placeholders = ", ".join(["%s"] * len(emails))
+        sql = f"""
+            SELECT
+                email
+            FROM
+                users
+            WHERE
+                email IN ({placeholders})
+        """
+
+        await self.cur.execute(sql, emails)
+
+        rows = await self.cur.fetchall()
+
+        return {row["email"] for row in rows}
+
+    # ユーザー一括作成（executemany により複数行INSERTにまとめられる）
+    @query_label("create_many")
+    async def create_many(
+        self,
+        users: list[UserInDB]
+    ) -> None:
+
+        sql = """
+            INSERT INTO users (
+                email,
+                pw
+            ) VALUES (
+                %(email)s,
+                %(pw)s
+            )
+        """
+
+        await self.cur.executemany(
+            sql, [user.model_dump() for user in users]
+        )
+
+    # ユーザー更新（更新対象の行数を返す）
+    @query_label("update")
     async def update(
         self,
         user: UserInDB
-    ) -> None:
+    ) -> int:
         
         sql = """
             UPDATE users
@@ -97,12 +307,44 @@ class UserRepo:
         await self.cur.execute(
             sql, user.model_dump()
         )
+
+        return self.cur.rowcount
+    
+    # パスワードハッシュの置き換え（ハッシュが old_pw のままの場合のみ更新し、更新した行数を返す）
+    # 検証後にパスワードが変更されていた場合は古いパスワードで上書きしない
+    @query_label("rehash")
+    async def rehash(
+        self,
+        email: str,
+        old_pw: str,
+        new_pw: str
+    ) -> int:
+        
+        sql = """
+            UPDATE users
+            SET
+                pw = %(pw)s
+            WHERE
+                email = %(email)s
+                AND pw = %(old_pw)s
+        """
+
+        await self.cur.execute(
+            sql, {
+                "email": email,
+                "pw": new_pw,
+                "old_pw": old_pw
+            }
+        )
+
+        return self.cur.rowcount
     
-    # ユーザー削除
+    # ユーザー削除（削除した行数を返す）
+    @query_label("delete")
     async def delete(
         self,
         email: str
-    ) -> None:
+    ) -> int:
         
         sql = """
             DELETE FROM users
@@ -114,4 +356,6 @@ class UserRepo:
             sql, {
                 "email": email
             }
-        )
\ No newline at end of file
+        )
+
+        return self.cur.rowcount
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from src.config import get_settings
+from src.db import get_conn_and_cursor
+from src.repositories.revoked_token import RevokedTokenRepo
+
+logger = logging.getLogger(__name__)
+
+# TimeBucketedBloomFilter クラスは、有効期限ごとのバケットに分けたブルームフィルターです。
+# 有効期限を過ぎたバケットは丸ごと破棄するため、要素を個別に削除しなくても大きさが一定に保たれます。
+# 「含まれない」という判定は確実で、「含まれる」という判定は誤検知の可能性があります。
+class TimeBucketedBloomFilter:
+
+    def __init__(
+        self,
+        bits: int,
+        hashes: int,
+        bucket_seconds: int
+    ):
+        self.bits = bits
+        self.hashes = hashes
+        self.bucket_seconds = bucket_seconds
+        # バケットの終了時刻 -> ビット列
+        self._buckets: dict[int, bytearray] = {}
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    # 要素を追加（有効期限 exp が属するバケットに登録する）
+    def add(self, key: str, exp: float) -> None:
+        bucket_end = (int(exp) // self.bucket_seconds + 1) * self.bucket_seconds
+        bucket = self._buckets.get(bucket_end)
+        if bucket is None:
+            bucket = self._buckets[bucket_end] = bytearray(self.bits // 8 + 1)
+        for pos in self._positions(key):
+            bucket[pos >> 3] |= 1 << (pos & 7)
+
+    # 要素が含まれている可能性があるかどうか
+    def __contains__(self, key: str) -> bool:
+        if not self._buckets:
+            return False
+        self.purge()
+        positions = self._positions(key)
+        for bucket in self._buckets.values():
+            if all(bucket[pos >> 3] & (1 << (pos & 7)) for pos in positions):
+                return True
+        return False
+
+    # 有効期限を過ぎたバケットを破棄
+    def purge(self) -> None:
+        now = time.time()
+        for bucket_end in [b for b in self._buckets if b <= now]:
+            del self._buckets[bucket_end]
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "bytes": sum(len(b) for b in self._buckets.values()),
+        }
+
+# 失効トークンのブルームフィルター
+@lru_cache
+def get_revocation_filter() -> TimeBucketedBloomFilter:
+    settings = get_settings()
+    return TimeBucketedBloomFilter(
+        bits=settings.REVOCATION_BLOOM_BITS,
+        hashes=settings.REVOCATION_BLOOM_HASHES,
+        bucket_seconds=settings.REVOCATION_BUCKET_SECONDS
+    )
+
+# 同期済みの失効トークンのID
+last_synced_id = 0
+sync_task: asyncio.Task | None = None
+
+async def revoke(
+    cursor,
+    jti: str,
+    exp: float
+) -> None:
+    """
+    トークンを失効させる関数
+    :param cursor: データベースのカーソル
+    :param jti: トークンの jti クレーム
+    :param exp: トークンの有効期限（UNIX時刻）
+    """
+    await RevokedTokenRepo(cursor).add(jti, datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None))
+    get_revocation_filter().add(jti, exp)
+
+async def is_revoked(
+    cursor,
+    jti: str | None
+) -> bool:
+    """
+    トークンが失効しているかどうかを判定する関数
+    ブルームフィルターに含まれない場合はI/Oなしで False を返し、含まれる可能性がある場合だけデータベースで確認する
+    :param cursor: データベースのカーソル
+    :param jti: トークンの jti クレーム（jti のない古いトークンは失効対象外）
+    :return: 失効している場合はTrue
+    """
+    if jti is None or jti not in get_revocation_filter():
+        return False
+    return await RevokedTokenRepo(cursor).exists(jti)
+
+# 他のワーカーで失効したトークンをブルームフィルターに取り込む
+# AUTO_INCREMENT の id はコミット順に見えるとは限らない（id 11 が id 10 より先にコミットされる）ため、
+# 同期済みの最大 id から REVOCATION_SYNC_OVERLAP_IDS 件分を毎回読み直す（同じ jti の再登録は無害）
+async def sync_revocations() -> int:
+    global last_synced_id
+    revocation_filter = get_revocation_filter()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    since = max(0, last_synced_id - get_settings().REVOCATION_SYNC_OVERLAP_IDS)
+    async for conn, cursor in get_conn_and_cursor():
+        rows = await RevokedTokenRepo(cursor).get_since(since, now)
+    for row in rows:
+        expires_at = row["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+        revocation_filter.add(row["jti"], expires_at)
+        last_synced_id = max(last_synced_id, row["id"])
+    return len(rows)
+
+# 定期的に失効トークンを同期し、期限切れの行を削除する
+async def run_revocation_sync() -> None:
+    settings = get_settings()
+    while True:
+        await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
+        try:
+            await sync_revocations()
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            async for conn, cursor in get_conn_and_cursor():
+                await RevokedTokenRepo(cursor).delete_expired(now)
+        except Exception as e:
+            logger.warning("失効トークンの同期に失敗しました", extra={"error": str(e)})
+
+# 起動時に有効期限内の失効トークンを読み込み、同期処理を開始する
+async def init_revocation() -> None:
+    global sync_task
+    loaded = await sync_revocations()
+    sync_task = asyncio.create_task(run_revocation_sync())
+    logger.info("init_revocation: 失効トークンを読み込みました", extra={"loaded": loaded})
+
+# 同期処理を停止する
+async def close_revocation() -> None:
+    global sync_task
+    if sync_task is not None:
+        sync_task.cancel()
+        sync_task = None
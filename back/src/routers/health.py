@@ -0,0 +1,46 @@
+import asyncio
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from src.config import get_settings
+from src.db import acquire_conn
+from src.health import app_state
+
+# 死活監視用のルーター
+router = APIRouter(
+    tags=["Health"]
+)
+
+# プロセスが応答できるかどうか（liveness）
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+# トラフィックを受け付けられるかどうか（readiness）
+# 停止処理中でなく、ウォームアップが完了し、データベースに ping が通る場合のみ 200 を返す
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    if app_state["draining"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "draining"}
+        )
+
+    if not app_state["warmed_up"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "warming_up"}
+        )
+
+    try:
+        db_pool, conn = await acquire_conn()
+        try:
+            await asyncio.wait_for(conn.ping(), get_settings().DB_CONNECT_TIMEOUT_SECONDS)
+        finally:
+            db_pool.release(conn)
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "database_unavailable"}
+        )
+
+    return {"status": "ready"}
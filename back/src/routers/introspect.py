@@ -0,0 +1,88 @@
+import time
+from typing import Tuple
+from fastapi import APIRouter, Depends, Response
+from jose.exceptions import JWTError
+from src.config import Settings, get_settings
+from src.db import LazyConnection, LazyCursor, get_conn_and_cursor
+from src.dependencies.admin import require_introspect_client
+from src.dependencies.auth import decode_token, get_principal_cache
+from src.repositories.revoked_token import RevokedTokenRepo
+from src.repositories.user import UserRepo
+from src.revocation import get_revocation_filter
+from src.security import ACCESS_TOKEN_TYPE
+from src.schemas.introspect import IntrospectIn, IntrospectOut, IntrospectResult
+
+# APIサーバーからアクセストークンを検証するためのルーター（X-Introspect-Token が必要）
+router = APIRouter(
+    tags=["Introspect"],
+    dependencies=[Depends(require_introspect_client)]
+)
+
+# アクセストークンをまとめて検証するエンドポイント
+# 署名の検証と失効の判定はキャッシュとブルームフィルターを使い、
+# キャッシュにないユーザーだけを1回の IN クエリで確認します。
+@router.post("/introspect", responses={
+    200: {"description": "トークンごとの検証結果", "model": IntrospectOut},
+    403: {"description": "クライアントトークンが不正"},
+    404: {"description": "INTROSPECT_CLIENT_TOKEN が未設定"}
+})
+async def introspect(
+    body: IntrospectIn,
+    response: Response,
+    settings: Settings = Depends(get_settings),
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
+) -> IntrospectOut:
+    conn, cursor = conn_cursor
+    principal_cache = get_principal_cache()
+    revocation_filter = get_revocation_filter()
+
+    # 署名と有効期限を検証
+    payloads: list[dict | None] = []
+    for token in body.tokens:
+        if token.startswith("Bearer "):
+            token = token[len("Bearer "):]
+        try:
+            payload = decode_token(token)
+        except JWTError:
+            payload = None
+        # アクセストークン以外（リフレッシュトークンなど）は無効として扱う
+        if payload is not None and (payload.get("sub") is None or payload.get("typ") != ACCESS_TOKEN_TYPE):
+            payload = None
+        payloads.append(payload)
+
+    # ブルームフィルターで失効の可能性があるものだけデータベースで確認
+    revoked: set[str] = set()
+    for payload in payloads:
+        jti = payload.get("jti") if payload else None
+        if jti and jti in revocation_filter and await RevokedTokenRepo(cursor).exists(jti):
+            revoked.add(jti)
+
+    # キャッシュにないユーザーを1回のクエリで取得
+    emails = {p["sub"] for p in payloads if p and p.get("jti") not in revoked}
+    users = {email: user for email in emails if (user := principal_cache.get(email)) is not None}
+    missing = [email for email in emails if email not in users]
+    if missing:
+        fetched = await UserRepo(cursor).get_many(missing, primary=True)
+        for email, user in fetched.items():
+            principal_cache.set(email, user)
+        users.update(fetched)
+
+    results: list[IntrospectResult] = []
+    now = time.time()
+    max_age = settings.PRINCIPAL_CACHE_TTL_SECONDS
+    for payload in payloads:
+        if payload is None or payload.get("jti") in revoked or payload["sub"] not in users:
+            results.append(IntrospectResult(active=False))
+            continue
+        if payload.get("exp") is not None:
+            max_age = min(max_age, payload["exp"] - now)
+        results.append(IntrospectResult(
+            active=True,
+            sub=payload["sub"],
+            exp=payload.get("exp"),
+            jti=payload.get("jti")
+        ))
+
+    # 結果は最も早く切れるトークンの有効期限とプリンシパルキャッシュのTTLまでキャッシュできる
+    response.headers["Cache-Control"] = f"private, max-age={max(0, int(max_age))}"
+    return IntrospectOut(results=results)
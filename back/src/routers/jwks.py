@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+from src.keyring import get_keyring
+
+# 署名検証用の公開鍵を配布するルーター
+router = APIRouter(
+    tags=["Keys"]
+)
+
+# 公開鍵の一覧（JWKS）を取得するエンドポイント
+# 他のサービスはこの鍵でアクセストークンを手元で検証できます。
+@router.get("/.well-known/jwks.json", responses={
+    200: {"description": "公開鍵の一覧"}
+})
+async def get_jwks(response: Response) -> dict:
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return get_keyring().jwks()
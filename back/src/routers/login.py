@@ -1,17 +1,17 @@
-from fastapi import APIRouter, Cookie, Depends, Form, HTTPException, Response, status
+from fastapi import APIRouter, BackgroundTasks, Cookie, Depends, Form, HTTPException, Request, Response, status
 from typing import Annotated, Optional, Tuple
-from src.config import Settings, get_settings
-from src.dependencies.auth import get_cur_user, get_refresh_token_from_cookie
+from src.dependencies.auth import get_cur_user, get_principal_cache, get_refresh_token_from_cookie
 from src.repositories.user import UserRepo
 from src.schemas.login import Login
 from src.schemas.token import Token, TokenPayload
-from aiomysql import Connection, DictCursor
-from src.db import get_conn_and_cursor
+from src.db import LazyConnection, LazyCursor, get_conn_and_cursor
 from src.schemas.user import UserOut, UserOutDB
-from src.security import verify_pw, create_access_token, create_refresh_token
+from src.throttle import check_login_throttle, get_client_ip
+from src.revocation import is_revoked, revoke
+from src.keyring import get_keyring
+from src.security import verify_pw_async, get_hashed_pw_async, pw_needs_update, create_access_token, create_refresh_token, REFRESH_TOKEN_TYPE
 from datetime import datetime, timedelta
 import logging
-from jose import jwt
 from jose.exceptions import JWTError
 
 router = APIRouter(
@@ -19,15 +19,8 @@ router = APIRouter(
     tags=["Login"]
 )
 
-# ロガーの初期化
+# ロガーの初期化（出力先は src.logging_config で一括設定する）
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-# ログ出力フォーマットの設定
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-# コンソールへの出力ハンドラー
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
 
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,18 +28,49 @@ credentials_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+# 古いコストのパスワードハッシュを再計算して保存する（レスポンス返却後に実行）
+# 検証後にパスワードが変更されていた場合は更新しない
+async def rehash_pw(
+    email: str,
+    plain_pw: str,
+    old_pw: str
+):
+    try:
+        hashed_pw = await get_hashed_pw_async(plain_pw)
+        async for conn, cursor in get_conn_and_cursor():
+            updated = await UserRepo(cursor).rehash(email, old_pw, hashed_pw)
+        if updated:
+            get_principal_cache().invalidate(email)
+    except Exception as e:
+        logger.warning("パスワードの再ハッシュに失敗しました", extra={"email": email, "error": str(e)})
+
 # ログイン
 @router.post("/login", responses={
     200: {"description": "ログイン成功"},
     401: {"description": "認証失敗"},
+    429: {"description": "ログイン試行回数の上限を超えました"},
     500: {"description": "サーバーエラー"}
 })
 async def login(
+    request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     fd: Login,
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor)
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
 ):
     try:
+        # DBやbcryptの処理の前に試行回数を制限する
+        retry_after = check_login_throttle(
+            get_client_ip(request),
+            fd.email
+        )
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="ログイン試行回数の上限を超えました。しばらくしてから再度お試しください",
+                headers={"Retry-After": str(retry_after)},
+            )
+
         conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
 
@@ -61,12 +85,16 @@ async def login(
             )
         
         # パスワードの検証
-        if not verify_pw(fd.pw, user.pw):
+        if not await verify_pw_async(fd.pw, user.pw):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="メールアドレスまたはパスワードが無効です",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+
+        # ハッシュのコストが古い場合はレスポンス返却後に再ハッシュする
+        if pw_needs_update(user.pw):
+            background_tasks.add_task(rehash_pw, fd.email, fd.pw, user.pw)
         
         # アクセストークンの生成
         access_token_and_exp: tuple[str, datetime] = create_access_token(
@@ -115,9 +143,31 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         ) from e
     
-# ログアウト
+# クッキーのトークンを検証し、失効させる（検証できないトークンは無視する）
+async def revoke_cookie_token(
+    cursor: LazyCursor,
+    cookie: str | None
+) -> None:
+    if not cookie or not cookie.startswith("Bearer "):
+        return
+    try:
+        payload = get_keyring().verify(cookie[len("Bearer "):])
+    except JWTError:
+        return
+    if payload.get("jti") and payload.get("exp"):
+        await revoke(cursor, payload["jti"], payload["exp"])
+
+# ログアウト（アクセストークンとリフレッシュトークンをサーバー側でも失効させる）
 @router.post("/logout")
-def logout(response: Response):
+async def logout(
+    response: Response,
+    access_token: str | None = Cookie(default=None),
+    refresh_token: str | None = Cookie(default=None),
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
+):
+    conn, cursor = conn_cursor
+    await revoke_cookie_token(cursor, access_token)
+    await revoke_cookie_token(cursor, refresh_token)
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
     return {
@@ -126,33 +176,34 @@ def logout(response: Response):
 
 @router.get("/me", response_model=UserOutDB)
 async def get_own(cur_user: UserOutDB = Depends(get_cur_user)):
-    print(cur_user)
     return cur_user
 
 # リフレッシュ
 @router.post("/refresh")
-def refresh(
+async def refresh(
     response: Response,
     refresh_token = Depends(get_refresh_token_from_cookie),
-    settings: Settings = Depends(get_settings),
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor)
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
 ):
     try:
-        print(refresh_token)
         # トークンを検証
-        payload = jwt.decode(
-            token=refresh_token,
-            key=settings.TOKEN_SECRET_KEY,
-            algorithms=settings.TOKEN_ALGORITHM
-        )
+        payload = get_keyring().verify(refresh_token)
         email = payload.get("sub")
         if email is None:
             raise credentials_exception
+
+        # リフレッシュトークン以外を拒否
+        if payload.get("typ") != REFRESH_TOKEN_TYPE:
+            raise credentials_exception
+
+        # 失効済みのリフレッシュトークンを拒否
+        conn, cursor = conn_cursor
+        if await is_revoked(cursor, payload.get("jti")):
+            raise credentials_exception
         
         # ユーザーの存在を検証
-        conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
-        user = user_repo.get(email=email)
+        user = await user_repo.get(email=email)
         if user is None:
             raise credentials_exception
 
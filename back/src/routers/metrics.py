@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.admission import get_admission_stats
+from src.db import get_pool_stats
+from src.dependencies.auth import get_principal_cache, get_token_cache
+from src.metrics import render_metrics
+from src.security import get_hash_pool_stats
+
+# Prometheus 形式のメトリクスを返すルーター
+router = APIRouter(
+    tags=["Stats"]
+)
+
+# メトリクスを取得するエンドポイント
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics() -> str:
+    db_pool = get_pool_stats()
+    hash_pool = get_hash_pool_stats()
+    principal_cache = get_principal_cache().stats()
+    token_cache = get_token_cache().stats()
+    admission = get_admission_stats()
+    return render_metrics({
+        "db_pool_size": db_pool["size"],
+        "db_pool_free": db_pool["free"],
+        "db_pool_waiters": db_pool["waiters"],
+        "pw_hash_pending": hash_pool["pending"],
+        "pw_hash_rejected": hash_pool["rejected"],
+        "principal_cache_hits": principal_cache["hits"],
+        "principal_cache_misses": principal_cache["misses"],
+        "token_cache_hits": token_cache["hits"],
+        "token_cache_misses": token_cache["misses"],
+        # アドミッション制御の分類ごとの実行中・待機中のリクエスト数
+        **{f'admission_active{{class="{name}"}}': stats["active"] for name, stats in admission.items()},
+        **{f'admission_waiting{{class="{name}"}}': stats["waiting"] for name, stats in admission.items()},
+        **{f'admission_concurrency{{class="{name}"}}': stats["concurrency"] for name, stats in admission.items()},
+    })
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from src.admission import get_admission_stats
+from src.db import get_pool_stats
+from src.dependencies.admin import require_admin_token
+from src.dependencies.auth import get_principal_cache, get_token_cache
+from src.revocation import get_revocation_filter
+from src.security import get_hash_pool_stats
+from src.throttle import get_login_email_limiter, get_login_ip_limiter
+
+# 運用監視用の統計情報を返すルーター（X-Admin-Token が必要）
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"],
+    dependencies=[Depends(require_admin_token)]
+)
+
+# 各コンポーネントの統計情報を取得するエンドポイント
+@router.get("", responses={
+    200: {"description": "統計情報取得"},
+    403: {"description": "管理者トークンが不正"},
+    404: {"description": "ADMIN_TOKEN が未設定"}
+})
+async def get_stats() -> dict:
+    return {
+        "admission": get_admission_stats(),
+        "db_pool": get_pool_stats(),
+        "hash_pool": get_hash_pool_stats(),
+        "principal_cache": get_principal_cache().stats(),
+        "token_cache": get_token_cache().stats(),
+        "revocation_filter": get_revocation_filter().stats(),
+        "login_throttle": {
+            "ip": get_login_ip_limiter().stats(),
+            "email": get_login_email_limiter().stats(),
+        },
+    }
@@ -1,12 +1,17 @@
-from typing import Tuple
-from aiomysql import Connection, DictCursor
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
-from src.dependencies.auth import get_cur_user
-from src.schemas.user import UserInDB, UserOut, UserInCreate, UserInUpdate, UserOutDB
+import hashlib
+import json
+from typing import AsyncIterator, Tuple
+from aiomysql import IntegrityError
+from pymysql.constants import ER
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.dependencies.auth import get_cur_user, get_principal_cache
+from pydantic import ValidationError
+from src.config import Settings, get_settings
+from src.schemas.user import UserInDB, UserOut, UserInCreate, UserInUpdate, UserOutDB, UserBulkOut, UserBulkResult
 from src.repositories.user import UserRepo
-from src.security import get_hashed_pw
-from src.db import get_conn_and_cursor
+from src.security import get_hashed_pw_async, get_hashed_pws_async
+from src.db import LazyConnection, LazyCursor, get_conn_and_cursor, get_stream_cursor
 
 # ユーザー情報を管理するためのFastAPIルーターを定義します。
 # このルーターは、ユーザーのCRUD操作を提供します。
@@ -17,20 +22,51 @@ router = APIRouter(
     tags=["Users"]
 )
 
+# If-None-Match ヘッダーが ETag に一致するかどうか
+# If-None-Match は弱い比較（RFC 9110 13.1.2）のため、中継サーバーが付けた W/ は除いて比較する
+def etag_matches(
+    if_none_match: str | None,
+    etag: str
+) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+# 304 Not Modified のレスポンスを作成する
+def not_modified(
+    etag: str,
+    headers: dict[str, str] | None = None
+) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, **(headers or {})}
+    )
+
 # ユーザー情報を取得するエンドポイント
+# If-None-Match が現在のバージョンに一致する場合は軽量なバージョン取得だけで 304 を返します。
 @router.get("/{email}", responses={
     200: {"description": "ユーザー一覧取得", "model": UserOut},
+    304: {"description": "変更なし"},
     404: {"description": "ユーザーが存在しません"},
     500: {"description": "サーバーエラー"}
 })
 async def get_user(
     email: str,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
     user = Depends(get_cur_user),
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor)
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
 ) -> UserOut:
     try:
         conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
+
+        if if_none_match:
+            version = await user_repo.get_version(email)
+            if version is not None and etag_matches(if_none_match, f'"{version}"'):
+                return not_modified(f'"{version}"')
+
         user = await user_repo.get(email)
    
         if not user:
@@ -38,6 +74,8 @@ async def get_user(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"ユーザー：{email} は存在しません"
             )
+
+        response.headers["ETag"] = f'"{user_version(user)}"'
         
         return UserOut(
             email=user.email,
@@ -54,26 +92,57 @@ async def get_user(
         )
 
 # ユーザー情報の一覧を取得するエンドポイント
+# after と limit によるキーセットページネーションに対応し、
+# stream=true の場合は全件を NDJSON で逐次返却します。
 @router.get("/", responses={
     200: {"description": "List of users", "model": list[UserOut]},
     404: {"description": "No users found"},
     500: {"description": "サーバーエラー"}
 })
 async def get_users(
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor),
+    response: Response,
+    after: str | None = Query(default=None, description="このメールアドレスより後のユーザーを取得"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    stream: bool = Query(default=False, description="NDJSONで全件をストリーミング"),
+    if_none_match: str | None = Header(default=None),
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor),
     user = Depends(get_cur_user)
 ) -> list[UserOut]:
     try:
+        if stream:
+            return StreamingResponse(
+                stream_users(),
+                media_type="application/x-ndjson"
+            )
+
         conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
-        users = await user_repo.get_all()
+
+        # ページのバージョンが一致する場合は一覧を取得せずに 304 を返す
+        if if_none_match:
+            version = await user_repo.get_page_version(after=after, limit=limit)
+            etag = page_etag(version["count"], version["last_email"], version["digest"])
+            if version["count"] and etag_matches(if_none_match, etag):
+                headers = {"X-Next-After": version["last_email"]} if version["count"] == limit else {}
+                return not_modified(etag, headers)
+
+        users = await user_repo.get_page(after=after, limit=limit)
         
-        if not users:
+        if not users and after is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="ユーザーが存在しません"
             )
         
+        # 次のページがある可能性がある場合は次の after をヘッダーで返す
+        if len(users) == limit:
+            response.headers["X-Next-After"] = users[-1].email
+
+        digest = 0
+        for u in users:
+            digest ^= int(user_version(u)[:16], 16)
+        response.headers["ETag"] = page_etag(len(users), users[-1].email if users else None, digest)
+
         return [UserOut(email=user.email, pw=user.pw) for user in users]
     
     except HTTPException as err:
@@ -85,6 +154,26 @@ async def get_users(
             detail=f"サーバーエラー: {err}"
         )
 
+# ユーザーのバージョン（UserRepo.get_version と同じ計算）
+def user_version(user: UserOutDB) -> str:
+    return hashlib.md5(f"{user.email}:{user.pw}".encode()).hexdigest()
+
+# ページの ETag（UserRepo.get_page_version の結果から計算）
+def page_etag(
+    count: int,
+    last_email: str | None,
+    digest: int | None
+) -> str:
+    source = f"{count}:{last_email or ''}:{int(digest or 0)}"
+    return '"' + hashlib.md5(source.encode()).hexdigest() + '"'
+
+# ユーザーを NDJSON 形式で1行ずつ出力する
+async def stream_users():
+    async with get_stream_cursor() as cursor:
+        user_repo = UserRepo(cursor)
+        async for row in user_repo.iter_all():
+            yield UserOut(**row).model_dump_json(by_alias=True) + "\n"
+
 # ユーザーを作成するエンドポイント
 @router.post("/", responses={
     201: {"description": "ユーザーが正常に作成されました"},
@@ -93,23 +182,16 @@ async def get_users(
 })
 async def create_user(
     user_in: UserInCreate,
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor)
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
 ):
     try:
         conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
 
-        user = await user_repo.get(user_in.email)
-        
-        if user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="このメールアドレスは既に登録されています"
-            )
-        
+        # 重複チェックは email の一意キーに任せて1回のINSERTで行う
         await user_repo.create(UserInDB(
             email=user_in.email,
-            pw=get_hashed_pw(user_in.pw)
+            pw=await get_hashed_pw_async(user_in.pw)
         ))
 
         await conn.commit()
@@ -121,6 +203,17 @@ async def create_user(
     
     except HTTPException as err:
         raise err
+
+    except IntegrityError as err:
+        if err.args and err.args[0] == ER.DUP_ENTRY:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="このメールアドレスは既に登録されています"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"サーバーエラー: {err}"
+        )
     
     except Exception as err:
         await conn.rollback()
@@ -129,6 +222,178 @@ async def create_user(
             detail=f"サーバーエラー: {err}"
         )
 
+# リクエストボディを1件ずつ読み出す
+# ストリーミングで処理できるのは NDJSON のみ。JSON配列は全体を読み込むため BULK_JSON_MAX_BYTES を超える場合は413を返す
+async def read_bulk_rows(request: Request, max_json_bytes: int) -> AsyncIterator:
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type:
+        buf = b""
+        async for chunk in request.stream():
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buf.strip():
+            yield buf
+    else:
+        body = b""
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > max_json_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="大量の取り込みは application/x-ndjson で送信してください"
+                )
+        rows = json.loads(body)
+        if not isinstance(rows, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="JSON配列またはNDJSONを指定してください"
+            )
+        for row in rows:
+            yield row
+
+# チャンク単位でユーザーを作成し、行ごとの結果を返す
+async def create_user_chunk(
+    conn: LazyConnection,
+    user_repo: UserRepo,
+    chunk: list[tuple[int, UserInCreate]],
+    seen: set[str]
+) -> list[UserBulkResult]:
+    results: list[UserBulkResult] = []
+
+    # 既存ユーザーと取り込み内の重複を除外
+    existing = await user_repo.get_existing_emails([u.email for _, u in chunk])
+    targets: list[tuple[int, UserInCreate]] = []
+    for index, user_in in chunk:
+        if user_in.email in existing or user_in.email in seen:
+            results.append(UserBulkResult(index=index, email=user_in.email, status="duplicate"))
+            continue
+        seen.add(user_in.email)
+        targets.append((index, user_in))
+
+    if not targets:
+        return results
+
+    # ハッシュ用プロセスプールが混雑している場合（503）はこのチャンクを失敗として記録する
+    try:
+        hashed_pws = await get_hashed_pws_async([u.pw for _, u in targets])
+    except HTTPException as err:
+        seen.difference_update(user_in.email for _, user_in in targets)
+        results.extend(
+            UserBulkResult(index=index, email=user_in.email, status="failed", detail=str(err.detail))
+            for index, user_in in targets
+        )
+        return results
+    users = [
+        UserInDB(email=user_in.email, pw=hashed_pw)
+        for (_, user_in), hashed_pw in zip(targets, hashed_pws)
+    ]
+
+    try:
+        await conn.begin()
+        await user_repo.create_many(users)
+        await conn.commit()
+        results.extend(
+            UserBulkResult(index=index, email=user_in.email, status="created")
+            for index, user_in in targets
+        )
+        return results
+    except Exception:
+        await conn.rollback()
+
+    # 同時登録や長すぎる値などで一括INSERTが失敗した場合は1件ずつ登録し、行ごとの結果を記録する
+    for (index, user_in), user in zip(targets, users):
+        try:
+            await user_repo.create(user)
+            results.append(UserBulkResult(index=index, email=user_in.email, status="created"))
+        except IntegrityError:
+            results.append(UserBulkResult(index=index, email=user_in.email, status="duplicate"))
+        except Exception as err:
+            results.append(UserBulkResult(index=index, email=user_in.email, status="failed", detail=str(err)))
+    return results
+
+# チャンクの処理中に予期しないエラーが発生した場合は、そのチャンクの行を失敗として記録する
+# （それまでのチャンクはコミット済みのため、結果を捨てずに返す）
+async def create_user_chunk_or_fail(
+    conn: LazyConnection,
+    user_repo: UserRepo,
+    chunk: list[tuple[int, UserInCreate]],
+    seen: set[str]
+) -> list[UserBulkResult]:
+    try:
+        return await create_user_chunk(conn, user_repo, chunk, seen)
+    except Exception as err:
+        await conn.rollback()
+        seen.difference_update(user_in.email for _, user_in in chunk)
+        return [
+            UserBulkResult(index=index, email=user_in.email, status="failed", detail=str(err))
+            for index, user_in in chunk
+        ]
+
+# ユーザーを一括作成するエンドポイント
+@router.post("/bulk", responses={
+    200: {"description": "行ごとの作成結果", "model": UserBulkOut},
+    400: {"description": "リクエスト形式が不正です"},
+    413: {"description": "JSON配列が大きすぎます（NDJSONを使用してください）"},
+    500: {"description": "サーバーエラー"}
+})
+async def create_users_bulk(
+    request: Request,
+    settings: Settings = Depends(get_settings),
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor),
+    user = Depends(get_cur_user)
+) -> UserBulkOut:
+    conn, cursor = conn_cursor
+    user_repo = UserRepo(cursor)
+    results: list[UserBulkResult] = []
+    seen: set[str] = set()
+    chunk: list[tuple[int, UserInCreate]] = []
+
+    try:
+        index = 0
+        async for row in read_bulk_rows(request, settings.BULK_JSON_MAX_BYTES):
+            try:
+                if isinstance(row, bytes):
+                    chunk.append((index, UserInCreate.model_validate_json(row)))
+                else:
+                    chunk.append((index, UserInCreate.model_validate(row)))
+            except ValidationError as err:
+                results.append(UserBulkResult(index=index, status="failed", detail=str(err)))
+            index += 1
+
+            if len(chunk) >= settings.BULK_CHUNK_SIZE:
+                results.extend(await create_user_chunk_or_fail(conn, user_repo, chunk, seen))
+                chunk = []
+
+        if chunk:
+            results.extend(await create_user_chunk_or_fail(conn, user_repo, chunk, seen))
+
+    except HTTPException as err:
+        raise err
+
+    except json.JSONDecodeError as err:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"JSONの形式が不正です: {err}"
+        )
+
+    except Exception as err:
+        await conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"サーバーエラー: {err}"
+        )
+
+    results.sort(key=lambda r: r.index)
+    return UserBulkOut(
+        created=sum(r.status == "created" for r in results),
+        duplicates=sum(r.status == "duplicate" for r in results),
+        failed=sum(r.status == "failed" for r in results),
+        results=results
+    )
+
 # ユーザーを削除するエンドポイント
 @router.delete("/{email}", responses={
     200: {"description": "ユーザーが正常に削除されました"},
@@ -137,22 +402,22 @@ async def create_user(
 })
 async def delete_user(
     email: str,
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor)
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
 ):
     try:
         conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
         
-        user = await user_repo.get(email)
+        deleted = await user_repo.delete(email)
         
-        if not user:
+        if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"ユーザー：{email} は存在しません"
             )
         
-        await user_repo.delete(email)
         await conn.commit()
+        get_principal_cache().invalidate(email)
         
         return {"message": f"ユーザー：{email} が正常に削除されました"}
     
@@ -175,26 +440,25 @@ async def delete_user(
 async def update_user(
     email: str,
     user_in: UserInUpdate,
-    conn_cursor: Tuple[Connection, DictCursor] = Depends(get_conn_and_cursor)
+    conn_cursor: Tuple[LazyConnection, LazyCursor] = Depends(get_conn_and_cursor)
 ):
     try:
         conn, cursor = conn_cursor
         user_repo = UserRepo(cursor)
         
-        user = await user_repo.get(email)
+        updated = await user_repo.update(UserInDB(
+            email=email,
+            pw=user_in.pw
+        ))
         
-        if not user:
+        if not updated:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"ユーザー：{email} は存在しません"
             )
-                
-        await user_repo.update(UserInDB(
-            email=email,
-            pw=user_in.pw
-        ))
 
         await conn.commit()
+        get_principal_cache().invalidate(email)
         
         return {"message": f"ユーザー：{email} が正常に更新されました"}
     
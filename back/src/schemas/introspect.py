@@ -0,0 +1,15 @@
+from pydantic import Field
+
+from src.schemas.base import BaseSchema
+
+class IntrospectIn(BaseSchema):
+    tokens: list[str] = Field(max_length=50)
+
+class IntrospectResult(BaseSchema):
+    active: bool
+    sub: str | None = None
+    exp: int | None = None
+    jti: str | None = None
+
+class IntrospectOut(BaseSchema):
+    results: list[IntrospectResult]
@@ -17,4 +17,16 @@ class UserInUpdate(BaseSchema):
 
 class UserInCreate(BaseSchema):
     email: str
-    pw: str
\ No newline at end of file
+    pw: str
+
+class UserBulkResult(BaseSchema):
+    index: int
+    email: str | None = None
+    status: str
+    detail: str | None = None
+
+class UserBulkOut(BaseSchema):
+    created: int
+    duplicates: int
+    failed: int
+    results: list[UserBulkResult]
\ No newline at end of file
@@ -1,15 +1,89 @@
 # fastapiのハッシュ化関数を使用して、パスワードのハッシュ化と検証を行います。
-from fastapi import Depends
+import asyncio
+import logging
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import jwt
 from typing import Union
 from datetime import timezone
 from src.schemas.token import TokenPayload
 from src.config import Settings, get_settings
+from src.metrics import jwt_duration_seconds, pw_hash_duration_seconds
+from src.timing import record_hash
+from src.keyring import get_keyring
+
+logger = logging.getLogger(__name__)
 
 # パスワードのハッシュ化と検証を行うためのコンテキストを作成
 pw_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pw_rounds: int | None = None
+
+# bcrypt のコストを指定してコンテキストを作り直す関数
+# 指定したコスト未満のハッシュは needs_update で更新対象になる
+def configure_pw_ctx(rounds: int | None) -> None:
+    global pw_ctx, pw_rounds
+    pw_rounds = rounds
+    if rounds is None:
+        pw_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    else:
+        pw_ctx = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds
+        )
+
+def calibrate_pw_rounds(
+    target_ms: float,
+    min_rounds: int,
+    max_rounds: int
+) -> int:
+    """
+    このホストでハッシュ化にかかる時間を計測し、目標時間内に収まる最大のコストを求める関数
+    :param target_ms: 1回のハッシュ化にかける時間の上限（ミリ秒）
+    :param min_rounds: コストの下限
+    :param max_rounds: コストの上限
+    :return: 目標時間内に収まる最大のコスト（収まらない場合は下限）
+    """
+    best = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        ctx = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+        start = time.perf_counter()
+        ctx.hash("calibration")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > target_ms:
+            break
+        best = rounds
+        # コストが1増えると時間は約2倍になるため、次が上限を超えるなら計測を打ち切る
+        if elapsed_ms * 2 > target_ms:
+            break
+    return best
+
+# 設定に従って bcrypt のコストを決定する関数
+def init_pw_ctx() -> int | None:
+    settings = get_settings()
+    rounds = settings.PW_HASH_ROUNDS
+    if settings.PW_HASH_CALIBRATE:
+        rounds = calibrate_pw_rounds(
+            settings.PW_HASH_TARGET_MS,
+            settings.PW_HASH_MIN_ROUNDS,
+            settings.PW_HASH_MAX_ROUNDS
+        )
+    configure_pw_ctx(rounds)
+    return rounds
+
+def pw_needs_update(hashed_pw: str) -> bool:
+    """
+    ハッシュのコストなどが現在の設定より古いかどうかを判定する関数
+    :param hashed_pw: ハッシュ化されたパスワード
+    :return: 再ハッシュが必要な場合はTrue
+    """
+    return pw_ctx.needs_update(hashed_pw)
 
 def verify_pw(
     plain_pw: str,
@@ -31,6 +105,167 @@ def get_hashed_pw(pw: str) -> str:
     """
     return pw_ctx.hash(pw)
 
+# bcrypt専用のプロセスプール
+hash_executor: ProcessPoolExecutor | None = None
+hash_workers: int = 0
+hash_queue_size: int = 0
+# 一括ハッシュ化が同時に使えるワーカー数の上限（ログインの検証用に残りのワーカーを空けておく）
+hash_bulk_semaphore: asyncio.Semaphore | None = None
+hash_bulk_batch_size: int = 1
+
+# ハッシュ処理の統計情報
+hash_stats = {
+    "pending": 0,
+    "rejected": 0,
+    "count": 0,
+    "total_seconds": 0.0,
+    "max_seconds": 0.0,
+    "rebuilds": 0,
+}
+
+# ハッシュ用プロセスプールを初期化する関数
+def init_hash_pool() -> None:
+    global hash_executor, hash_workers, hash_queue_size, hash_bulk_semaphore, hash_bulk_batch_size
+    if hash_executor is not None:
+        return
+    settings = get_settings()
+    hash_workers = settings.PW_HASH_WORKERS or os.cpu_count() or 1
+    hash_bulk_semaphore = asyncio.Semaphore(
+        settings.PW_HASH_BULK_WORKERS or max(1, hash_workers // 2)
+    )
+    hash_bulk_batch_size = max(1, settings.PW_HASH_BULK_BATCH_SIZE)
+    # ワーカープロセスにも同じコストを設定する
+    hash_executor = ProcessPoolExecutor(
+        max_workers=hash_workers,
+        initializer=configure_pw_ctx,
+        initargs=(pw_rounds,)
+    )
+    hash_queue_size = settings.PW_HASH_QUEUE_SIZE
+
+# ハッシュ用プロセスプールを終了する関数
+def close_hash_pool() -> None:
+    global hash_executor, hash_workers
+    if hash_executor is not None:
+        hash_executor.shutdown(wait=True, cancel_futures=True)
+        hash_executor = None
+        hash_workers = 0
+
+# ワーカープロセスが異常終了して使えなくなったプールを作り直す関数
+# 同時に失敗した複数のリクエストから呼ばれても、作り直すのは壊れたプールに対して1回だけ
+def _rebuild_broken_hash_pool(broken: ProcessPoolExecutor) -> None:
+    global hash_executor
+    if hash_executor is not broken:
+        return
+    hash_stats["rebuilds"] += 1
+    logger.error("パスワードハッシュ用プロセスプールのワーカーが異常終了したため作り直します")
+    # 壊れたプールの終了はイベントループを止めないよう待たない
+    broken.shutdown(wait=False, cancel_futures=True)
+    hash_executor = None
+    init_hash_pool()
+
+# ハッシュ用プロセスプールの状態を取得する関数
+def get_hash_pool_stats() -> dict:
+    count = hash_stats["count"]
+    return {
+        "workers": hash_workers,
+        "rounds": pw_rounds,
+        "queue_size": hash_queue_size,
+        "pending": hash_stats["pending"],
+        "rejected": hash_stats["rejected"],
+        "count": count,
+        "avg_seconds": hash_stats["total_seconds"] / count if count else 0.0,
+        "max_seconds": hash_stats["max_seconds"],
+        "rebuilds": hash_stats["rebuilds"],
+    }
+
+# プロセスプールで関数を実行する（待ち行列が満杯の場合は即座に503）
+async def _run_in_hash_pool(func, *args):
+    if hash_executor is None:
+        init_hash_pool()
+
+    if hash_stats["pending"] >= hash_queue_size:
+        hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="サーバーが混雑しています。しばらくしてから再度お試しください",
+            headers={"Retry-After": "1"},
+        )
+
+    hash_stats["pending"] += 1
+    start = time.perf_counter()
+    executor = hash_executor
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # ワーカープロセスが OOM などで終了した場合はプールを作り直し、このリクエストは503を返す
+        _rebuild_broken_hash_pool(executor)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="サーバーが混雑しています。しばらくしてから再度お試しください",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        hash_stats["pending"] -= 1
+        hash_stats["count"] += 1
+        hash_stats["total_seconds"] += elapsed
+        hash_stats["max_seconds"] = max(hash_stats["max_seconds"], elapsed)
+        pw_hash_duration_seconds.observe(elapsed, func.__name__)
+        record_hash(elapsed)
+
+async def verify_pw_async(
+    plain_pw: str,
+    hashed_pw: str
+) -> bool:
+    """
+    verify_pw をプロセスプールで実行する非同期版
+    :param plain_pw: 平文のパスワード
+    :param hashed_pw: ハッシュ化されたパスワード
+    :return: パスワードが一致する場合はTrue、一致しない場合はFalse
+    """
+    return await _run_in_hash_pool(verify_pw, plain_pw, hashed_pw)
+
+async def get_hashed_pw_async(pw: str) -> str:
+    """
+    get_hashed_pw をプロセスプールで実行する非同期版
+    :param pw: ハッシュ化するパスワード
+    :return: ハッシュ化されたパスワード
+    """
+    return await _run_in_hash_pool(get_hashed_pw, pw)
+
+def get_hashed_pws(pws: list[str]) -> list[str]:
+    """
+    複数のパスワードをまとめてハッシュ化する関数
+    :param pws: ハッシュ化するパスワードのリスト
+    :return: ハッシュ化されたパスワードのリスト
+    """
+    return [pw_ctx.hash(pw) for pw in pws]
+
+async def _hash_bulk_part(pws: list[str]) -> list[str]:
+    async with hash_bulk_semaphore:
+        return await _run_in_hash_pool(get_hashed_pws, pws)
+
+async def get_hashed_pws_async(pws: list[str]) -> list[str]:
+    """
+    複数のパスワードを小さな単位に分割して並列にハッシュ化する非同期版
+    一括処理が同時に使うワーカー数は PW_HASH_BULK_WORKERS までに制限し、
+    単位ごとにワーカーを手放すため、ログインの検証は一括処理の合間に実行される
+    :param pws: ハッシュ化するパスワードのリスト
+    :return: 入力と同じ順序のハッシュ化されたパスワードのリスト
+    """
+    if hash_executor is None:
+        init_hash_pool()
+
+    size = hash_bulk_batch_size
+    parts = [pws[i:i + size] for i in range(0, len(pws), size)]
+    results = await asyncio.gather(*[_hash_bulk_part(part) for part in parts])
+    return [hashed for part in results for hashed in part]
+
+# トークンの種類（typ クレーム）。リフレッシュトークンをアクセストークンとして使わせないために区別する
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
 # アクセストークンを発行
 def create_access_token(
     payload: TokenPayload
@@ -38,8 +273,10 @@ def create_access_token(
     settings: Settings = get_settings()
     to_encode = payload.model_dump()
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.TOKEN_ACCESS_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.TOKEN_SECRET_KEY, settings.TOKEN_ALGORITHM)
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(16), "typ": ACCESS_TOKEN_TYPE})
+    start = time.perf_counter()
+    encoded_jwt = get_keyring().sign(to_encode)
+    jwt_duration_seconds.observe(time.perf_counter() - start, "encode")
     return encoded_jwt, expire
 
 # リフレッシュトークンを発行
@@ -50,7 +287,9 @@ def create_refresh_token(
     settings: Settings = get_settings()
     to_encode = payload.model_dump()
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.TOKEN_REFRESH_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.TOKEN_SECRET_KEY, settings.TOKEN_ALGORITHM)
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(16), "typ": REFRESH_TOKEN_TYPE})
+    start = time.perf_counter()
+    encoded_jwt = get_keyring().sign(to_encode)
+    jwt_duration_seconds.observe(time.perf_counter() - start, "encode")
     return encoded_jwt, expire
 
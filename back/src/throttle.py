@@ -0,0 +1,126 @@
+import math
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from fastapi import Request
+
+from src.config import get_settings
+
+# TokenBucketLimiter クラスは、キーごとのトークンバケットで試行回数を制限するリミッターです。
+# キーは (トークン数, 最終更新時刻) の組だけを保持し、上限件数を超えた場合は最も古いキーから追い出します。
+# トークンが満タンまで回復したキーは保持する必要がないため、hit() のたびに最も古いキーから順に確認して削除します。
+class TokenBucketLimiter:
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: int,
+        maxsize: int
+    ):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.rejected = 0
+        self.evictions = 0
+
+    def hit(self, key: str) -> float:
+        """
+        トークンを1つ消費する関数
+        :param key: 制限の単位となるキー（IPアドレスやメールアドレス）
+        :return: 許可する場合は0、拒否する場合は再試行までの秒数
+        """
+        now = time.monotonic()
+        bucket = self._buckets.pop(key, None)
+        self._sweep(now)
+        if bucket is None:
+            tokens = float(self.burst)
+        else:
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.rejected += 1
+            return (1 - tokens) / self.rate
+
+        self._buckets[key] = (tokens - 1, now)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return 0.0
+
+    # 満タンまで回復したキーを古い順に削除する（回復していないキーに当たったら止める）
+    def _sweep(self, now: float, limit: int = 8) -> None:
+        for _ in range(limit):
+            if not self._buckets:
+                return
+            key, (tokens, updated) = next(iter(self._buckets.items()))
+            if tokens + (now - updated) * self.rate < self.burst:
+                return
+            del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._buckets),
+            "maxsize": self.maxsize,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+        }
+
+# ログイン試行のリミッター（IPアドレス単位）
+@lru_cache
+def get_login_ip_limiter() -> TokenBucketLimiter:
+    settings = get_settings()
+    return TokenBucketLimiter(
+        rate_per_second=settings.LOGIN_IP_RATE_PER_MINUTE / 60,
+        burst=settings.LOGIN_IP_BURST,
+        maxsize=settings.LOGIN_THROTTLE_MAX_KEYS
+    )
+
+# ログイン試行のリミッター（メールアドレス単位）
+@lru_cache
+def get_login_email_limiter() -> TokenBucketLimiter:
+    settings = get_settings()
+    return TokenBucketLimiter(
+        rate_per_second=settings.LOGIN_EMAIL_RATE_PER_MINUTE / 60,
+        burst=settings.LOGIN_EMAIL_BURST,
+        maxsize=settings.LOGIN_THROTTLE_MAX_KEYS
+    )
+
+# 信頼するプロキシのアドレス
+@lru_cache
+def get_trusted_proxies() -> frozenset[str]:
+    return frozenset(h.strip() for h in get_settings().TRUSTED_PROXIES.split(",") if h.strip())
+
+def get_client_ip(request: Request) -> str | None:
+    """
+    クライアントのIPアドレスを取得する関数
+    ロードバランサーなどの背後では request.client.host はプロキシのアドレスになるため、
+    接続元が TRUSTED_PROXIES に含まれる場合のみ X-Forwarded-For を右から辿り、最初の信頼しないアドレスを返す
+    :param request: リクエスト
+    :return: クライアントのIPアドレス
+    """
+    host = request.client.host if request.client else None
+    trusted = get_trusted_proxies()
+    if host is None or host not in trusted:
+        return host
+    forwarded = request.headers.get("x-forwarded-for", "")
+    for addr in reversed([a.strip() for a in forwarded.split(",") if a.strip()]):
+        if addr not in trusted:
+            return addr
+    return host
+
+def check_login_throttle(
+    ip: str | None,
+    email: str
+) -> int:
+    """
+    ログイン試行を許可するか判定する関数
+    :param ip: クライアントのIPアドレス
+    :param email: ログインしようとしているメールアドレス
+    :return: 許可する場合は0、拒否する場合は Retry-After に設定する秒数
+    """
+    wait = get_login_ip_limiter().hit(ip or "unknown")
+    if not wait:
+        wait = get_login_email_limiter().hit(email.lower())
+    return math.ceil(wait)
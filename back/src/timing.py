@@ -0,0 +1,104 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# RequestTiming クラスは、1リクエスト内のSQL実行回数と各処理の所要時間を集計します。
+class RequestTiming:
+
+    __slots__ = ("db_count", "db_seconds", "auth_seconds", "hash_seconds", "statements")
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+    # Server-Timing ヘッダーの値
+    def header(self) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_count} queries", '
+            f'auth;dur={self.auth_seconds * 1000:.2f};desc="excl. db", '
+            f"hash;dur={self.hash_seconds * 1000:.2f}"
+        )
+
+# 処理中のリクエストの集計（リクエスト外では None）
+request_timing: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+# SQLの実行を記録する
+def record_sql(sql: str, seconds: float) -> None:
+    timing = request_timing.get()
+    if timing is not None:
+        timing.db_count += 1
+        timing.db_seconds += seconds
+        timing.statements[" ".join(sql.split())] += 1
+
+# このリクエストでここまでにSQLにかかった時間（リクエスト外では 0）
+def get_db_seconds() -> float:
+    timing = request_timing.get()
+    return timing.db_seconds if timing is not None else 0.0
+
+# 認証にかかった時間を記録する（SQLの時間は db に計上されるため除いて渡す）
+def record_auth(seconds: float) -> None:
+    timing = request_timing.get()
+    if timing is not None:
+        timing.auth_seconds += seconds
+
+# パスワードハッシュにかかった時間を記録する
+def record_hash(seconds: float) -> None:
+    timing = request_timing.get()
+    if timing is not None:
+        timing.hash_seconds += seconds
+
+# ServerTimingMiddleware クラスは、リクエストごとのSQL実行回数と所要時間を Server-Timing ヘッダーで返し、
+# 同じSQLの繰り返しやクエリ数の上限超過を警告するASGIミドルウェアです。
+class ServerTimingMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+        self.query_budget = get_settings().SQL_QUERY_BUDGET
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"server-timing", timing.header().encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timing.reset(token)
+            self.check(scope, timing)
+
+    # 同じSQLの繰り返しとクエリ数の上限超過を警告する
+    def check(self, scope, timing: RequestTiming) -> None:
+        if not timing.db_count:
+            return
+        repeated = {sql: n for sql, n in timing.statements.items() if n > 1}
+        if repeated:
+            logger.warning("同じSQLが1リクエスト内で繰り返し実行されました", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "repeated": repeated,
+            })
+        if timing.db_count > self.query_budget:
+            logger.warning("1リクエストのクエリ数が上限を超えました", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "queries": timing.db_count,
+                "budget": self.query_budget,
+            })
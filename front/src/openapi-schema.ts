@@ -312,8 +312,16 @@ export interface operations {
     };
     getUsers: {
         parameters: {
-            query?: never;
-            header?: never;
+            query?: {
+                /** @description このメールアドレスより後のユーザーを取得 */
+                after?: string | null;
+                limit?: number;
+                /** @description NDJSONで全件をストリーミング */
+                stream?: boolean;
+            };
+            header?: {
+                "if-none-match"?: string | null;
+            };
             path?: never;
             cookie?: {
                 access_token?: string | null;
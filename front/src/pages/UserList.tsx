@@ -8,13 +8,24 @@ const UserList: React.FC = () => {
     const [users, setUsers] = useState<paths["/users/"]["get"]["responses"]["200"]["content"]["application/json"]>([]);
     const navigate = useNavigate();
 
+    // 一覧はページ単位で返るため、X-Next-After ヘッダーがなくなるまで続きを取得する
     const fetchUsers = async () => {
-        const { data, error } = await apiClient.GET("/users/", {});
-        if (error) {
-            console.error("Failed to fetch users:", error);
-            return;
-        }
-        setUsers(data || []);
+        const all: typeof users = [];
+        let after: string | undefined = undefined;
+        do {
+            const { data, error, response } = await apiClient.GET("/users/", {
+                params: {
+                    query: { after, limit: 1000 }
+                }
+            });
+            if (error) {
+                console.error("Failed to fetch users:", error);
+                return;
+            }
+            all.push(...(data || []));
+            after = response.headers.get("X-Next-After") ?? undefined;
+        } while (after !== undefined);
+        setUsers(all);
     };
 
     const handleDel = async (email: string) => {